@@ -1,5 +1,5 @@
-import copy
-
+from util.BnfBuilder import BnfBuilder
+from util.Grammar import Grammar
 from util.Lexer import Lexer
 
 token_exprs = [
@@ -78,135 +78,51 @@ def is_start(p):
         raise AssertionError(f'is_start {type(p)} not supported.')
 
 
-def first(Grammar, Non_terminals):
-    cache = {}
-
-    for nt in Non_terminals:
-        get_first(Grammar, nt, cache)
-
-    return cache
+def grammar_of(G, start_symbol) -> Grammar:
+    """
+    The compiled Grammar of a grammar dict like the one above, a bare symbol standing for a one symbol production.
+    The LL(1) functions below work on its symbol and production ids.
+    """
+    return Grammar([(nt, tuple(rule) if isinstance(rule, (list, tuple)) else (rule,))
+                    for nt, production_rules in G.items() for rule in production_rules], start_symbol, epsilon,
+                   eof=eof)
 
 
-def get_first(G, non_terminal, cache):
+def first_follow(grammar: Grammar) -> tuple[list[int], int, list[int]]:
     """
-    1) If x is terminal, then FIRST(x)={x}
-
-    2) If X→ ε is production, then add ε to FIRST(X)
+    FIRST and FOLLOW of every nonterminal id as bitsets of symbol ids, and the bitset of nullable nonterminals,
+    as BnfBuilder computes them: (first, nullable, follow).
 
-    3) If X is a non-terminal and X → PQR then FIRST(X)=FIRST(P)
+    1) FIRST(X) holds a if X -> a..., and FIRST(Y) if X -> Y..., going on past Y while Y derives ε.
+    2) FOLLOW(S) holds $ for the start symbol S.
+    3) A -> α B β puts FIRST(β) in FOLLOW(B), and FOLLOW(A) too when β derives ε.
+    """
+    rules = grammar.rules()
+    first_bits, nullable = BnfBuilder.first_bits(rules, grammar.nt_count)
+    start = grammar.symbol_ids.get(grammar.start_symbol, -1)
+    follow_bits = BnfBuilder.follow_bits(rules, grammar.nt_count, first_bits, nullable, start, grammar.eof_id)
+    return first_bits, nullable, follow_bits
 
-       If FIRST(P) contains ε, then
 
-       FIRST(X) = (FIRST(P) – {ε}) U FIRST(QR)
-    :param G:
-    :param non_terminal:
-    :param cache:
-    :return:
+def first(grammar: Grammar) -> dict:
     """
-    if cache.get(non_terminal, None) is not None:
-        return cache.get(non_terminal)
-    first_set = set()
-    for production in G[non_terminal]:
-        # X -> a，a为终结符，将a加入first(X)
-        if is_terminal(production[0]):
-            first_set.add(production[0])
-            cache[non_terminal] = first_set
-        # X -> εY1Y2...Yk，将ε加入first(X),同时将first(Y1Y2...Yk)加入first(X)
-        elif is_epsilon(production[0]):
-            first_set.add(production[0])
-            if len(production) > 1:
-                first_set |= get_first(G, production[1], cache)
-            cache[non_terminal] = first_set
-        # X -> C,C为非终结符，first(X) = first(C)
-        elif is_non_terminal(production[0]):
-            first_set = get_first(G, production[0], cache)
-            cache[non_terminal] = first_set
-    return first_set
-
-
-def follow(Grammar, Non_terminals, first_set):
-    cache = {}
-
-    for nt in Non_terminals:
-        get_follow(Grammar, nt, first_set, cache)
-
-    return cache
-
-
-def get_follow(G, p, first_set, follow_set):
+    FIRST of every nonterminal as a set of symbols, with ε for the nullable ones.
     """
-    1) For Start symbol, place $ in FOLLOW(S)
-
-    2) If A→ α B, then FOLLOW(B) = FOLLOW(A)
-
-    3) If A→ α B β, then
-
-      If ε not in FIRST(β),
-
-           FOLLOW(B) = FIRST(β)
-
-      else do,
+    first_bits, nullable, _ = first_follow(grammar)
+    return BnfBuilder.first_dict(grammar.symbols[:grammar.nt_count], grammar.symbols, first_bits, nullable, epsilon)
 
-           FOLLOW(B) = (FIRST(β)-{ε}) U FOLLOW(A)
 
-    一个文法符号的FOLLOW集就是可能出现在这个文法符号后面的终结符.
-
-    比如 S->ABaD, 那么FOLLOW(B)的值就是a。
-
-    如果First(B)包含空:
-    1). FOLLOW(A)的值包含了FIRST(B)中除了ε以外的所有终结符;
-    2). 把FOLLOW(B)的值也添加到FOLLOW(A)中
-
-    D是文法符号S的最右符号，
-    那么所有跟在S后面的符号必定跟在D后面。所以FOLLOW(S)所有的值都在FOLLOW(D)中.
-
-    以下是书中的总结
+def follow(grammar: Grammar) -> dict:
+    """
+    FOLLOW of every nonterminal as a set of symbols.
+    """
+    _, _, follow_bits = first_follow(grammar)
+    terminals = grammar.symbols[grammar.nt_count:]
+    return {nt: BnfBuilder.bits_to_set(follow_bits[i] >> grammar.nt_count, terminals)
+            for i, nt in enumerate(grammar.symbols[:grammar.nt_count])}
 
-    不断应用下面这两个规则，直到没有新的FOLLOW集被加入
-    规则一: FOLLOW(S)中加入$, S是文法开始符号
-    规则二: A->CBY FOLLOW(B) 就是FIRST(Y)
-    规则三: A->CB 或者 A->CBZ(Z可以推导出ε) 所有FOLLOW(A)的符号都在FOLLOW(B)
 
-    :param G:
-    :param p:
-    :param first_set:
-    :param follow_set:
-    :return:
-    """
-    if p in follow_set:
-        return follow_set[p]
-    f = set()
-    # put $ to follow(S) if S is start symbol
-    if is_start(p):
-        f.add(eof)
-    for nt, prod_list in G.items():
-        for prod in prod_list:
-            if p not in prod:
-                continue
-            i = prod.index(p)
-            # A -> aB, follow(B) = follow(A)
-            if i == len(prod) - 1:
-                # prevent infinite recursion of like E -> aE
-                if nt != p:
-                    f |= get_follow(G, nt, first_set, follow_set)
-            else:
-                # A -> Bc, put c in follow(B)
-                if is_terminal(prod[i + 1]):
-                    f.add(prod[i + 1])
-                # A -> aBC, put first(C) - ε to follow(B)
-                elif is_non_terminal(prod[i + 1]):
-                    next_first = copy.deepcopy(first_set[prod[i + 1]])
-                    if epsilon in next_first:
-                        next_first.remove(epsilon)
-                        if nt != p:
-                            f |= get_follow(G, prod[i + 1], first_set, follow_set)
-                    f |= next_first
-
-    follow_set[p] = f
-    return f
-
-
-def parsing_table(G, first_set, follow_set):
+def parsing_table(grammar: Grammar) -> list[dict[int, int]]:
     """
     Step 1: For each production A → α , of the given grammar perform Step 2 and Step 3.
 
@@ -216,43 +132,39 @@ def parsing_table(G, first_set, follow_set):
 
     Step 4: If ε is in FIRST(α) and $ is the FOLLOW(A), ADD A → α to T[A,$].
 
-    :param G:
-    :param first_set:
-    :param follow_set:
+    The table has a row per nonterminal id, a dict from terminal id to production id. On a conflict the first
+    production is kept.
+    :param grammar:
     :return:
     """
-    table = dict()
-    for nt, production_rules in G.items():
-        table[nt] = dict()
-        print(f"-- start construct {nt} row")
-        for production_rule in production_rules:
-            print(f"{nt} -> {production_rule}")
-            first_symbol = production_rule[0]
-            print(f"    first symbol is: {first_symbol}")
-            if is_terminal(first_symbol) or first_symbol == eof:
-                predict_set = {first_symbol}
-                print(f"    first symbol {first_symbol} is terminal, predict set is {predict_set}")
-            elif is_epsilon(first_symbol):
-                predict_set = follow_set[nt]
-                print(f"    first symbol {first_symbol} is epsilon, predict set the follow set of {nt}: {predict_set}")
+    first_bits, nullable, follow_bits = first_follow(grammar)
+    symbols = grammar.symbols
+    table = [dict() for _ in range(grammar.nt_count)]
+    for p, (lhs, rhs) in enumerate(grammar.rules()):
+        predict = 0
+        for s in rhs:
+            if not grammar.is_non_terminal(s):
+                predict |= 1 << s
+                break
+            predict |= first_bits[s]
+            if not nullable >> s & 1:
+                break
+        else:
+            predict |= follow_bits[lhs]
+        row = table[lhs]
+        while predict:
+            low = predict & -predict
+            symbol = low.bit_length() - 1
+            if symbol in row:
+                print(f"Grammar is not LL(1) at {grammar.productions[p]} and {grammar.productions[row[symbol]]} "
+                      f"on {symbols[symbol]}")
             else:
-                predict_set = first_set[first_symbol]
-                print(
-                    f"    first symbol {first_symbol} is not epsilon, predict set is the first set of first symbol {first_symbol}: {predict_set}")
-            for symbol in predict_set:
-                if symbol in table[nt]:
-                    print(
-                        f"Grammar is not LL(1) at {nt}:{production_rule} \
-                        and {table[nt][symbol]}")
-                else:
-                    table[nt][symbol] = production_rule
-                    print(f"    table[{nt}][{symbol}] is: {production_rule}")
-        print(f"merged table[{nt}] is {table[nt]}")
-        print()
+                row[symbol] = p
+            predict ^= low
     return table
 
 
-def parse(start_symbol, parsing_table, input_list):
+def parse(grammar: Grammar, parsing_table, input_list) -> bool:
     """
     https://stackoverflow.com/questions/54706455/ll-top-down-parser-from-cst-to-ast/54751222#54751222
 
@@ -274,37 +186,38 @@ def parse(start_symbol, parsing_table, input_list):
     * The top of the parser stack was a non-terminal. We then identify the appropriate right-hand side using the
       current input symbol, and push that right-hand side (right-to-left) onto the parser stack.
 
-    :param start_symbol:
+    The stack holds symbol ids of grammar and parsing_table comes from parsing_table(grammar). input_list holds the
+    token types, without eof.
+    :param grammar:
     :param parsing_table:
-    :param input_string:
+    :param input_list:
     :return:
     """
-    input_list.append(eof)
-    stack = [eof, start_symbol]
+    ids = grammar.symbol_ids
+    symbols = grammar.symbols
+    tokens = [ids.get(t, -1) for t in input_list]
+    tokens.append(grammar.eof_id)
+    stack = [grammar.eof_id, ids[grammar.start_symbol]]
     i = 0
 
-    while len(stack) > 0:
+    while stack:
         top = stack.pop()
+        current = input_list[i] if i < len(input_list) else grammar.eof
         # Rule1: if a non-terminal on top of the stack,replace it with its RHS.
         # T[non-terminal,lookahead] = production
-        if is_non_terminal(top):
-            production = parsing_table[top].get(input_list[i], None)
-            print(f'  top:{top}, input cursor:{input_list[i]}: {production}')
+        if grammar.is_non_terminal(top):
+            production = parsing_table[top].get(tokens[i])
             if production is None:
-                print(f"no production for table[{top},{input_list[i]}], parse error!")
+                print(f"no production for table[{symbols[top]},{current}], parse error!")
                 return False
-
-            for symbol in reversed(production):
-                if not is_epsilon(symbol):
-                    stack.append(symbol)
+            print(f'  top:{symbols[top]}, input cursor:{current}: {grammar.productions[production][1]}')
+            stack.extend(reversed(grammar.rhs(production)))
         # Rule2: if a terminal on top of the stack,pop it and advance string cursor
-        elif is_terminal(top):
-            if top == input_list[i]:
-                i += 1
-
-            else:
-                print(f"expect \"{top}\" but get \"{input_list[i]}\"")
-                return False
+        elif top == tokens[i]:
+            i += 1
+        else:
+            print(f"expect \"{symbols[top]}\" but get \"{current}\"")
+            return False
 
     return True
 
@@ -335,12 +248,11 @@ def eliminateLeftRecursion(grammar):
 
 
 if __name__ == '__main__':
-    first_set = first(grammar, non_terminal)
-    print('first set:', first_set)
-    follow_set = follow(grammar, non_terminal, first_set)
-    print('follow set:', follow_set)
+    compiled = grammar_of(grammar, start_symbol)
+    print('first set:', first(compiled))
+    print('follow set:', follow(compiled))
 
-    table = parsing_table(grammar, first_set, follow_set)
+    table = parsing_table(compiled)
     print('parsing table', table)
 
     text = '(3 + 4 )*(4+1)'
@@ -349,5 +261,5 @@ if __name__ == '__main__':
     while lexer.has_next():
         inputs.append(lexer.next().type)
     print(inputs)
-    accepted = parse(start_symbol, table, inputs)
+    accepted = parse(compiled, table, inputs)
     print(accepted)
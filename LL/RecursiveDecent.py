@@ -52,7 +52,7 @@ class ExpressionEvaluator:
         """
         self._text = string
         self._lexer = Lexer(self._text, token_expr)
-        self._lookahead = self._lexer.next()
+        self._lookahead = self._lexer.peek()
         return self.expr()
 
     def expr(self):
@@ -129,5 +129,6 @@ class ExpressionEvaluator:
         if token.type != token_type:
             raise SyntaxError(f'Unexpected token:{token.value},expected:{token_type}')
 
-        self._lookahead = self._lexer.next()
+        self._lexer.advance()
+        self._lookahead = self._lexer.peek()
         return token
@@ -33,13 +33,13 @@ class ExpressionEvaluatorEBNF:
         """
         self._text = string
         self._lexer = Lexer(self._text, token_expr)
-        self._lookahead = self._lexer.next()
+        self._lookahead = self._lexer.peek()
         return self.expr()
 
     def parse_ast(self, string, token_expr):
         self._text = string
         self._lexer = Lexer(self._text, token_expr)
-        self._lookahead = self._lexer.next()
+        self._lookahead = self._lexer.peek()
         return self.expr_tree()
 
     def expr_tree(self):
@@ -153,5 +153,6 @@ class ExpressionEvaluatorEBNF:
         if token.type != token_type:
             raise SyntaxError(f'Unexpected token:{token.value},expected:{token_type}')
 
-        self._lookahead = self._lexer.next()
+        self._lexer.advance()
+        self._lookahead = self._lexer.peek()
         return token
@@ -1,84 +1,102 @@
-from LR.LR0Parser import LRState, Item0
+from LR.LR0Parser import LR0Parser, LRState, Item0
 from LR.LR1Parser import LR1Parser, Item1
+from util.Digraph import digraph
 
 
 class LALR1Parser(LR1Parser):
-    def __init__(self, bnf_file: str, eof: str = '$'):
-        super().__init__(bnf_file, eof)
+    """
+    LALR(1) tables from the LR(0) automaton: lookaheads are computed with DeRemer and Pennello's relations instead of
+    building the canonical LR(1) collection and merging its states by core. The states come out as LR(0) states whose
+    items are Item1 with the frozenset of their lookaheads as lookahead, one item per core.
+    """
 
-    def group_indices(self, A):
-        index_list = []
-        for i, elem in enumerate(A):
-            added = False
-            for group in index_list:
-                if elem == A[group[0]]:
-                    group.append(i)
-                    added = True
-                    break
-            if not added:
-                index_list.append([i])
-        return index_list
+    def __init__(self, bnf_file: str, eof: str = '$', **kwargs):
+        super().__init__(bnf_file, eof, **kwargs)
 
-    def combine(self, name: int, states: list[LRState], state_item_lookahead: list[dict[Item0:set]]):
-        items = set()
-        name_trans = {}
-        for index, state in enumerate(states):
-            d = state_item_lookahead[index]
-            name_trans[state.name] = name
-            for item in state.items:
-                item0, lookahead = item.split()
-                lookaheads = d[item0]
-                for l in lookaheads:
-                    items.add(Item1(item0.lhs, item0.rule, item0.pos, l))
-        return LRState(name, items), name_trans
+    # the automaton is the LR(0) one
+    augment_grammar = LR0Parser.augment_grammar
+    closure = LR0Parser.closure
 
-    def merge_state(self, states: list[LRState], goto: dict[tuple:int]):
-        item_set = []
-        state_item_lookahead = []
+    def lookaheads(self, states: list[LRState], trans_map: dict[tuple:int]) -> dict[tuple, set]:
+        """
+        (state name, Item0) -> frozenset of lookahead terminals, for every item of the LR(0) automaton.
 
-        for index, s in enumerate(states):
-            item0_set = set()
-            state_item_lookahead.append(dict())
-            for i in s.items:
-                item0, lookahead = i.split()
-                item0_set.add(item0)
-                if item0 not in state_item_lookahead[index]:
-                    state_item_lookahead[index][item0] = set(lookahead)
-                else:
-                    state_item_lookahead[index][item0].add(lookahead)
-            item_set.append(item0_set)
+        The vertices are the nonterminal transitions (p, A), plus (0, S') standing for the end of input. DR(p, A) holds
+        the terminals shifted right after the transition, Read(p, A) adds the Read of the transitions over nullable
+        nonterminals that follow it (reads), and Follow(p, A) the Follow of every (p', B) that it completes, for
+        B -> β A γ with γ nullable and p' --β--> p (includes). Both are closed with digraph over int bitsets. An item
+        A -> α . β of state q has the Follow of every (p, A) with p --α--> q, which for A -> α . is the lookback
+        relation.
+        """
+        compiled = self.compiled
+        ids = compiled.symbol_ids
+        nullable = {symbol for symbol, first in self.first_set.items() if self.epsilon in first}
+        nullable.add(self.epsilon)
+        out = [[] for _ in states]
+        for (name, symbol), target in trans_map.items():
+            out[name].append((symbol, target))
 
-        group = self.group_indices(item_set)
-        new_states = []
-        name_trans_map = {}
-        for index, g in enumerate(group):
-            new_state, name_trans = self.combine(index, [states[i] for i in g], [state_item_lookahead[i] for i in g])
-            name_trans_map.update(name_trans)
-            new_states.append(new_state)
-        new_goto = {}
-        for name, symbol in goto:
-            new_goto[(name_trans_map[name], symbol)] = name_trans_map[goto[(name, symbol)]]
-        return new_states, new_goto
+        transitions = [(self.init_state.name, self.start_symbol)]
+        transitions.extend(key for key in trans_map if self.is_non_terminal(key[1]))
+        vertex = {t: x for x, t in enumerate(transitions)}
+        initial = [1 << compiled.eof_id] + [0] * (len(transitions) - 1)
+        reads = [[] for _ in transitions]
+        for x in range(1, len(transitions)):
+            target = trans_map[transitions[x]]
+            for symbol, _ in out[target]:
+                if self.is_terminal(symbol):
+                    initial[x] |= 1 << ids[symbol]
+                elif symbol in nullable and self.is_non_terminal(symbol):
+                    reads[x].append(vertex[(target, symbol)])
+        read = digraph(reads, initial)
 
-    def canonical_collection(self) -> tuple[list[LRState], dict[tuple:int]]:
-        states = [self.init_state]
-        trans_map = {}
-        work_list = [self.init_state]
+        # walk every production of every transition through the automaton
+        includes = [[] for _ in transitions]
+        sources = {}
+        production_items = {}
+        for x, (name, lhs) in enumerate(transitions):
+            for p in compiled.nt_productions[ids[lhs]]:
+                rule = compiled.productions[p][1]
+                items = production_items.get(p)
+                if items is None:
+                    items = production_items[p] = [Item0(lhs, rule, pos, table=self.item_table)
+                                                   for pos in range(len(rule) + 1)]
+                path = [name]
+                for symbol in rule:
+                    path.append(trans_map[(path[-1], symbol)])
+                for state, item in zip(path, items):
+                    sources.setdefault((state, item), []).append(x)
+                for pos in range(len(rule) - 1, -1, -1):
+                    if self.is_non_terminal(rule[pos]):
+                        includes[vertex[(path[pos], rule[pos])]].append(x)
+                    if rule[pos] not in nullable:
+                        break
+        follow = digraph(includes, read)
+
+        symbols = compiled.symbols
+        result = {}
+        # few distinct lookahead sets, shared between items
+        terminal_sets = {}
+        for key, xs in sources.items():
+            bits = 0
+            for x in xs:
+                bits |= follow[x]
+            terminals = terminal_sets.get(bits)
+            if terminals is None:
+                terminals = terminal_sets[bits] = frozenset(symbols[s] for s in range(bits.bit_length())
+                                                            if bits >> s & 1)
+            result[key] = terminals
+        return result
 
-        while len(work_list) > 0:
-            state = work_list.pop()
-            symbols = state.next_symbols()
-            for s in symbols:
-                items = self.goto(state, s)
-                index = self.find_index(states, items)
-                if index == -1:
-                    new_state = LRState(len(states), items)
-                    states.append(new_state)
-                    trans_map[(state.name, s)] = new_state.name
-                    work_list.append(new_state)
-                else:
-                    trans_map[(state.name, s)] = index
-        states, trans_map = self.merge_state(states, trans_map)
+    def lookahead_symbols(self, item: [Item1]):
+        return item.lookahead
+
+    def canonical_collection(self) -> tuple[list[LRState], dict[tuple:int]]:
+        states, trans_map = LR0Parser.canonical_collection(self)
+        lookaheads = self.lookaheads(states, trans_map)
+        table = self.item_table
+        states = [LRState(s.name, {Item1(i.lhs, i.rule, i.pos, lookaheads[(s.name, i)], table=table) for i in s.items},
+                          kernel=s.kernel) for s in states]
         self.lr0_states = states
         self.lr0_trans_function = trans_map
 
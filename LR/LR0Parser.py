@@ -1,20 +1,69 @@
-import copy
 import json
+import re
 
 import jsbeautifier
 from graphviz import Digraph
 from prettytable import PrettyTable, ALL
 
 from util.BnfBuilder import BnfBuilder
-from util.Lexer import Token
+from util.Lexer import Lexer, SpanToken, Token, TokenBatch
+from util.Digraph import digraph
+from util.Grammar import Grammar
+from util.LineIndex import LineIndex
+from util.TableCache import TableCache
+
+
+# a semantic action that just passes the value of one rhs symbol on, white space removed
+COPY_ACTION = re.compile(r'\{result=p(\d+)\}')
+
+
+class ItemTable:
+    """
+    The interned items of one parser: code -> item, and (item class, key) -> code of the item with the dot at 0. Each
+    parser has its own, so the items go away with it.
+    """
+    __slots__ = ('items', 'codes')
+
+    def __init__(self):
+        self.items = []
+        self.codes = {}
+
+    def intern(self, cls, key: tuple, pos: int):
+        code = self.codes.get((cls, key))
+        if code is None:
+            code = self.codes[(cls, key)] = len(self.items)
+            for i in range(len(key[1]) + 1):
+                item = object.__new__(cls)
+                item._set(key, i)
+                item.key = key
+                item.hash = hash((key, i))
+                item.table = self
+                item.code = code + i
+                self.items.append(item)
+        return self.items[code + pos]
+
+    def __reduce__(self):
+        # unpickled items are interned again into the new table
+        return ItemTable, ()
 
 
 class Item0:
-    def __init__(self, lhs: str, rule: tuple, pos: int, eof_symbol: str = '$') -> None:
-        self.lhs = lhs
-        self.rule = rule if isinstance(rule, tuple) else tuple(rule)
+    """
+    An LR(0) item. Items are hash-consed in an ItemTable: building the same item twice in one table returns the same
+    object, so item sets of one parser compare by identity with a hash computed once. The positions of one rule get
+    consecutive codes, which makes moving the dot an index increment into the table. Without a table the item gets
+    one of its own; items of different tables compare by value.
+    """
+    __slots__ = ('lhs', 'rule', 'pos', 'eof_symbol', 'key', 'hash', 'table', 'code')
+
+    def __new__(cls, lhs: str, rule: tuple, pos: int, eof_symbol: str = '$', table: ItemTable = None):
+        if table is None:
+            table = ItemTable()
+        return table.intern(cls, (lhs, rule if isinstance(rule, tuple) else tuple(rule), eof_symbol), pos)
+
+    def _set(self, key: tuple, pos: int):
+        self.lhs, self.rule, self.eof_symbol = key
         self.pos = pos
-        self.eof_symbol = eof_symbol
 
     def peek_dot_right(self):
         if self.pos > len(self.rule) - 1:
@@ -23,9 +72,7 @@ class Item0:
 
     def move(self):
         if self.pos < len(self.rule):
-            new_item = copy.deepcopy(self)
-            new_item.pos += 1
-            return new_item
+            return self.table.items[self.code + 1]
         return None
 
     def __str__(self) -> str:
@@ -36,26 +83,32 @@ class Item0:
     def __repr__(self):
         return self.__str__()
 
-    def __key(self):
-        return self.lhs, self.rule, self.pos
+    def __eq__(self, other):
+        return self is other or (type(self) is type(other) and self.pos == other.pos and self.key == other.key)
 
     def __hash__(self):
-        return hash(self.__key())
+        return self.hash
 
-    def __eq__(self, other):
-        if isinstance(other, Item0):
-            return self.__key() == other.__key()
-        return False
+    def __reduce__(self):
+        return Item0, (self.lhs, self.rule, self.pos, self.eof_symbol, self.table)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
 
 class LRState:
-    def __init__(self, name: int, items: set[Item0], eof_symbol: str = '$'):
+    def __init__(self, name: int, items: set[Item0], eof_symbol: str = '$', kernel: frozenset = None):
         self.name = name if name is not None else 0
         self.items = items if items is not None else set()
         self.eof_symbol = eof_symbol
+        # the items the state was made from, which determine the others
+        self.kernel = kernel
 
     def add_item(self, item: Item0):
-        self.items.add(item)
+        self.items = self.items | {item}
 
     def add_items(self, items: set[Item0]):
         self.items = self.items.union(items)
@@ -64,7 +117,7 @@ class LRState:
         self.name = name
 
     def next_symbols(self):
-        return [s.peek_dot_right() for s in self.items if s.peek_dot_right() is not self.eof_symbol]
+        return list(dict.fromkeys(s.peek_dot_right() for s in self.items if s.peek_dot_right() != self.eof_symbol))
 
     def __str__(self) -> str:
         s = []
@@ -79,7 +132,7 @@ class LRState:
 class LR0Parser:
 
     def __init__(self, bnf_file: str, eof: str = '$', print_ast=True, show_parsing_table=True, show_graph_state=True,
-                 print_first_follow=True, show_parsing_steps=True):
+                 print_first_follow=True, show_parsing_steps=True, bypass_unit_rules=True, cache_dir: str = None):
         self.bnf_file = bnf_file
         self.bnf_builder = BnfBuilder(bnf_file)
         self.bnf_builder.build()
@@ -92,16 +145,52 @@ class LR0Parser:
         self.start_symbol = self.bnf_builder.start_symbol
         self.precedence = self.bnf_builder.precedence
         self.eof = eof
+        # the augmented grammar compiled to integers, set by augment_grammar
+        self.compiled = None
+        # per nonterminal: the nonterminals it starts with as a bitset, and its items with the dot at 0 (see closure)
+        self.nt_reach = None
+        self.nt_items = None
+        # kernel -> its closure
+        self.kernel_closures = {}
+        # the items of this parser, see Item0
+        self.item_table = ItemTable()
         self.lr0_states = None
         self.lr0_trans_function = None
         self.init_state = None
         self.action_table = None
         self.goto_table = None
         self.parsing_table = None
-        self.bnf_builder.build_first_set()
-        self.bnf_builder.build_follow_set()
-        self.first_set = self.bnf_builder.first_set
-        self.follow_set = self.bnf_builder.follow_set
+        self.expected = None
+        # code object of every semantic action, see compile_actions
+        self.action_code = None
+        # productions whose action is {result=pK}: production -> K - 1
+        self.copy_rules = None
+        # the unit productions A -> B among them, and the goto shortcuts around them
+        self.bypass_unit_rules = bypass_unit_rules
+        self.unit_rules = None
+        self.unit_gotos = {}
+        # reductions executed by the last parse
+        self.reduce_count = 0
+        # (source, LineIndex) of the last token list that was located
+        self._line_index = None
+        # on-disk cache of FIRST/FOLLOW, the tables and the compiled actions of this grammar, see build_tables
+        self.table_cache = TableCache(cache_dir) if cache_dir else None
+        self.cache_key = None
+        self.cached = None
+        if self.table_cache:
+            with open(bnf_file, 'rb') as f:
+                source = f.read()
+            self.cache_key = TableCache.key(source, type(self).__qualname__, eof,
+                                            TableCache.module_sources(type(self), BnfBuilder, Grammar, digraph))
+            self.cached = self.table_cache.load(self.cache_key)
+        if self.cached:
+            self.first_set = self.cached['first']
+            self.follow_set = self.cached['follow']
+        else:
+            self.bnf_builder.build_first_set(eof)
+            self.bnf_builder.build_follow_set(eof)
+            self.first_set = self.bnf_builder.first_set
+            self.follow_set = self.bnf_builder.follow_set
         self.augment_grammar()
         if print_first_follow:
             self.print_first_follow()
@@ -192,12 +281,16 @@ class LR0Parser:
     def augment_grammar(self):
         old_start = self.bnf_builder.start_symbol
         new_start = old_start + "'"
+        self.compiled = self.bnf_builder.build_grammar(self.eof).augment(new_start)
+        self.nt_reach = None
+        self.nt_items = None
+        self.kernel_closures = {}
         self.grammar[new_start] = [[old_start]]
         self.non_terminals.add(new_start)
         self.start_symbol = new_start
         self.first_set[new_start] = self.first_set[old_start]
-        self.follow_set[new_start] = set(self.eof)
-        self.init_state = LRState(0, (self.closure([Item0(f"{new_start}", (old_start,), 0)])))
+        self.follow_set[new_start] = {self.eof}
+        self.init_state = LRState(0, (self.closure([Item0(f"{new_start}", (old_start,), 0, table=self.item_table)])))
         self.grammar_list.insert(0, (new_start, (old_start,)))
         self.semantic_action.insert(0, None)
 
@@ -222,29 +315,37 @@ class LR0Parser:
         :param G:
         :return:
         """
-        result = set(copy.deepcopy(items))
-        is_change = True
-        last_size = len(result)
-
-        while is_change:
-            new_items = set()
-            for item in result:
-                next_i = item.peek_dot_right()
-                if self.is_non_terminal(next_i):
-                    for rule in self.grammar[next_i]:
-                        i = Item0(next_i, rule, 0)
-                        if i not in result:
-                            new_items.add(i)
-            result |= new_items
-
-            if len(result) != last_size:
-                is_change = True
-                last_size = len(result)
-            else:
-                is_change = False
-
+        kernel = frozenset(items)
+        result = self.kernel_closures.get(kernel)
+        if result is None:
+            if self.nt_reach is None:
+                self.build_nt_closures()
+            compiled = self.compiled
+            ids = compiled.symbol_ids
+            # the nonterminals after a dot, and all they start with
+            reach = 0
+            for item in kernel:
+                symbol = ids.get(item.peek_dot_right(), compiled.nt_count)
+                if symbol < compiled.nt_count:
+                    reach |= self.nt_reach[symbol]
+            result = set(kernel)
+            while reach:
+                low = reach & -reach
+                result.update(self.nt_items[low.bit_length() - 1])
+                reach ^= low
+            result = self.kernel_closures[kernel] = frozenset(result)
         return result
 
+    def build_nt_closures(self):
+        """
+        The closure of one nonterminal A is the items B -> . γ of every B that A starts with, directly or not. The
+        starts-with relation is closed once over the grammar with digraph, so that closure only takes unions.
+        """
+        compiled = self.compiled
+        self.nt_reach = digraph(compiled.left_corners(), [1 << a for a in range(compiled.nt_count)])
+        self.nt_items = [[Item0(compiled.symbols[a], compiled.productions[p][1], 0, table=self.item_table)
+                          for p in compiled.nt_productions[a]] for a in range(compiled.nt_count)]
+
     def goto(self, state: LRState, symbol: str) -> set[Item0]:
         """
         GOTO 函数有两个参数，其中一个是某个项集，另一个是语法中的符号——可以是终结符，也可以是非终结符，还可以是 eof.
@@ -259,19 +360,38 @@ class LR0Parser:
         :param G:
         :return:
         """
+        return self.closure(list(self.goto_kernel(state, symbol)))
+
+    def goto_kernel(self, state: LRState, symbol: str) -> frozenset:
+        """
+        The kernel items of GOTO(state, symbol), before the closure.
+        """
         new_items = []
         for i in state.items:
             if i.peek_dot_right() == symbol:
                 moved_item = i.move()
                 if moved_item:
                     new_items.append(moved_item)
-        return self.closure(new_items)
+        return frozenset(new_items)
 
-    def find_index(self, states: list[LRState], items: set[Item0]) -> int:
-        for index, s in enumerate(states):
-            if s.items == items:
-                return index
-        return -1
+    def successor_kernels(self, state: LRState) -> dict:
+        """
+        symbol -> kernel of GOTO(state, symbol) for every symbol after a dot, from one pass over the items of state.
+        Symbols come in grammar order, so that the numbering of states does not depend on set iteration order.
+        """
+        buckets = {}
+        for i in state.items:
+            symbol = i.peek_dot_right()
+            if symbol != state.eof_symbol:
+                moved_item = i.move()
+                if moved_item:
+                    buckets.setdefault(symbol, []).append(moved_item)
+        order = self.compiled.symbol_ids
+        return {symbol: frozenset(buckets[symbol]) for symbol in sorted(buckets, key=lambda s: order.get(s, len(order)))}
+
+    def init_kernel(self) -> frozenset:
+        # the start items S' -> . S, the only items with the dot at 0 that are kernel items
+        return frozenset(i for i in self.init_state.items if i.lhs == self.start_symbol)
 
     def canonical_collection(self) -> tuple[list[LRState], dict[tuple:int]]:
         """
@@ -280,18 +400,21 @@ class LR0Parser:
         :param G:
         :return:
         """
+        self.init_state.kernel = self.init_kernel()
         states = [self.init_state]
         trans_map = {}
         work_list = [self.init_state]
+        # kernel -> state name. A state is its kernel's closure, so states are told apart by their kernels alone and
+        # the closure is only computed for a kernel seen for the first time
+        kernels = {self.init_state.kernel: self.init_state.name}
 
         while len(work_list) > 0:
             state = work_list.pop()
-            symbols = state.next_symbols()
-            for s in symbols:
-                items = self.goto(state, s)
-                index = self.find_index(states, items)
-                if index == -1:
-                    new_state = LRState(len(states), items)
+            for s, kernel in self.successor_kernels(state).items():
+                index = kernels.get(kernel)
+                if index is None:
+                    new_state = LRState(len(states), self.closure(list(kernel)), kernel=kernel)
+                    kernels[kernel] = new_state.name
                     states.append(new_state)
                     trans_map[(state.name, s)] = new_state.name
                     work_list.append(new_state)
@@ -303,18 +426,8 @@ class LR0Parser:
         # self.graph_state(states, trans_map)
         return states, trans_map
 
-    def _rightmost_terminal(self, item) -> int:
-        for i in range(len(item) - 1, -1, -1):
-            if self.is_terminal(item[i]):
-                return i
-        return -1
-
     def _precedence(self, terminal) -> tuple:
-        for i, ps in enumerate(self.precedence):
-            for p in ps:
-                if p[1] == terminal:
-                    return i, p[0]
-        return None, None
+        return self.compiled.precedence.get(terminal, (None, None))
 
     def lookahead_symbols(self, item: [Item0]):
         return list(self.terminals) + [self.eof]
@@ -397,7 +510,7 @@ class LR0Parser:
         self.resolve_ambiguity()
         if self.show_parsing_table:
             self.print_parsing_table(action_table, goto_table, self.lr0_states, self.grammar)
-        self.parsing_table = {**action_table, **goto_table}
+        self.set_parsing_table(action_table, goto_table)
         if self.show_graph_state:
             self.graph_state(self.lr0_states, self.lr0_trans_function, self.action_table)
         for k in self.parsing_table:
@@ -406,6 +519,41 @@ class LR0Parser:
 
         return action_table, goto_table
 
+    def set_parsing_table(self, action_table: dict, goto_table: dict):
+        self.action_table = action_table
+        self.goto_table = goto_table
+        self.parsing_table = {**action_table, **goto_table}
+        self.expected = None
+        self.copy_rules = None
+        self.unit_rules = None
+        self.unit_gotos = {}
+
+    def build_tables(self) -> tuple[dict, dict]:
+        """
+        canonical_collection and build_parse_table, or with a cache_dir, the tables an earlier run stored for the same
+        grammar. Tables loaded from the cache come without the item sets, so they are neither printed nor graphed.
+        """
+        if self.cached is None:
+            self.canonical_collection()
+            self.build_parse_table()
+            if self.table_cache:
+                if self.action_code is None:
+                    self.compile_actions()
+                self.cached = {
+                    'first': self.first_set,
+                    'follow': self.follow_set,
+                    'action': self.action_table,
+                    'goto': self.goto_table,
+                    'code': self.action_code,
+                }
+                self.table_cache.store(self.cache_key, self.cached)
+        else:
+            self.lr0_states = None
+            self.lr0_trans_function = None
+            self.set_parsing_table(self.cached['action'], self.cached['goto'])
+            self.action_code = self.cached['code']
+        return self.action_table, self.goto_table
+
     def resolve_ambiguity(self):
         """
         消除文法的二义性
@@ -440,13 +588,8 @@ class LR0Parser:
                     # make a0 shift and a1 reduce
                     a0, a1 = a1, a0
 
-                lhs, rhs = self.grammar_list[a1[1]]
-                # no terminal
-                i = self._rightmost_terminal(rhs)
-                if i == -1:
-                    precedence2, association2 = i, None
-                else:
-                    precedence2, association2 = self._precedence(rhs[i])
+                # precedence of the rightmost terminal, -1 without terminal
+                precedence2, association2 = self.compiled.production_precedence[a1[1]]
                 if precedence2 is None:
                     continue
                 # current symbol precedence > expression precedence, shift
@@ -469,9 +612,9 @@ class LR0Parser:
                 self.action_table[key] = a0 if a0[1] < a1[1] else a1
 
     def lookup_grammar(self, lhs: str, rhs: tuple) -> int:
-        for index, g in enumerate(self.grammar_list):
-            if g[0] == lhs and g[1] == rhs:
-                return index
+        index = self.compiled.production_index.get((lhs, tuple(rhs)))
+        if index is not None:
+            return index
         raise AssertionError(f"rule {lhs} -> {' '.join(rhs)} not found")
 
     def print_grammar(self):
@@ -537,64 +680,80 @@ class LR0Parser:
         report success
 
         https://serokell.io/blog/how-to-implement-lr1-parser
+        tokens is a token list (or TokenBatch) ending with an eof token, or a Lexer: the parser then scans the input
+        itself, asking the lexer only for the terminals the current state has an action for (see Lexer.scan).
+
         :param tokens:
         :return:
         """
         steps = []
         stage = 0
         stack = [(0, Token(self.eof, self.eof))]
+        lexer = tokens if isinstance(tokens, Lexer) else None
+        if self.action_code is None:
+            self.compile_actions()
+        if self.copy_rules is None:
+            self.find_copy_rules()
+        self.reduce_count = 0
         pos = 0
-        word = tokens[pos]
+        word = self.scan(lexer, 0) if lexer else tokens[pos]
         value_stack = []
         while True:
-            # stage,stack,symbols,input,action
             stage += 1
-            stack_ = " ".join([str(s[0]) for s in stack])
-            symbol_ = " ".join([s[1] if isinstance(s[1], str) else s[1].type for s in stack])
-            # show at most 15 tokens
-            input_ = "".join([t.value for t in tokens[pos:pos + 15]])
-
-            step = [stage, stack_, symbol_, input_]
+            # the trace is only built when it is shown, so that token values are not materialized for nothing
+            step = self.parsing_step(stage, stack, [word] if lexer else tokens, 0 if lexer else pos,
+                                     self.locate(tokens, word)) if self.show_parsing_steps else None
             state = stack[-1]
             key = (state[0], word[0])
-            if self.parsing_table[key][0] == 'r':
-                g = self.parsing_table[key][1]
+            action = self.parsing_table.get(key)
+            if action is None:
+                location = self.locate(tokens, word)
+                raise AssertionError(f"Parse failed: unexpected {word[0]} in state {state[0]}" +
+                                     (f" at {location}" if location else ""))
+            if action[0] == 'r':
+                g = action[1]
                 lhs, rhs = self.grammar_list[g][0], self.grammar_list[g][1]
                 values = []
                 for _ in range(len(rhs)):
                     stack.pop()
                     values.append(value_stack.pop())
                 values.reverse()
-                semantic_action = self.semantic_action[g]
-                if semantic_action:
-                    semantic_action = semantic_action.strip()[1:-1].strip()
+                copied = self.copy_rules.get(g)
+                if copied is not None:
+                    # {result=pK}: no need to exec it
+                    v = values[copied]
+                    value_stack.append(v.value if isinstance(v, Token) else v)
                 else:
-                    semantic_action = """result={}"""
-                params = {
-                    "result": None,
-                }
-                for index, v in enumerate(values):
-                    params[f"p{index + 1}"] = v.value if isinstance(v, Token) else v
-                exec(semantic_action, params)
-                value_stack.append(params.get("result"))
-                goto_state = self.parsing_table[(stack[-1][0], lhs)]
+                    params = {
+                        "result": None,
+                    }
+                    for index, v in enumerate(values):
+                        params[f"p{index + 1}"] = v.value if isinstance(v, Token) else v
+                    exec(self.action_code[g], params)
+                    value_stack.append(params.get("result"))
+                self.reduce_count += 1
+                if self.unit_rules:
+                    goto_state, lhs = self.unit_goto(stack[-1][0], lhs, word[0])
+                else:
+                    goto_state = self.parsing_table[(stack[-1][0], lhs)]
                 new_state = (goto_state, lhs)
                 stack.append(new_state)
-                r = self.parsing_table[key]
-                step.append(f"{r[0]}{r[1]}: reduce by {lhs} -> {' '.join(rhs)},goto {goto_state}")
-                steps.append(step)
-            elif self.parsing_table[key][0] == 's':
-                goto_state = self.parsing_table[key][1]
+                if step:
+                    step.append(f"{action[0]}{action[1]}: reduce by {lhs} -> {' '.join(rhs)},goto {goto_state}")
+                    steps.append(step)
+            elif action[0] == 's':
+                goto_state = action[1]
                 stack.append((goto_state, word))
                 value_stack.append(word)
-                s = self.parsing_table[key]
-                step.append(f'{s[0]}{s[1]}: shift {word.type},goto {goto_state}')
-                steps.append(step)
+                if step:
+                    step.append(f'{action[0]}{action[1]}: shift {word.type},goto {goto_state}')
+                    steps.append(step)
                 pos += 1
-                word = tokens[pos]
-            elif self.parsing_table[key][0] == 'acc':
-                step.append('accept')
-                steps.append(step)
+                word = self.scan(lexer, goto_state) if lexer else tokens[pos]
+            elif action[0] == 'acc':
+                if step:
+                    step.append('accept')
+                    steps.append(step)
                 break
             else:
                 raise AssertionError("Parse failed")
@@ -609,9 +768,102 @@ class LR0Parser:
             opts.indent_size = 2
             print(jsbeautifier.beautify(json.dumps(self.ast), opts))
 
+    def compile_actions(self):
+        """
+        Compile every semantic action once instead of on every reduction; the code objects also go to the table cache.
+        """
+        self.action_code = []
+        for semantic_action in self.semantic_action:
+            if semantic_action:
+                semantic_action = semantic_action.strip()[1:-1].strip()
+            else:
+                semantic_action = """result={}"""
+            self.action_code.append(compile(semantic_action, self.bnf_file, 'exec'))
+
+    def find_copy_rules(self):
+        """
+        Find the productions whose action is {result=pK}. parse copies the value instead of running their action, and
+        with bypass_unit_rules, skips the unit productions A -> B among them altogether: reducing by them only
+        relabels the top of the stack (see unit_goto).
+        """
+        self.copy_rules = {}
+        self.unit_rules = set()
+        for index, (lhs, rhs) in enumerate(self.grammar_list):
+            m = COPY_ACTION.fullmatch(re.sub(r'\s+', '', self.semantic_action[index] or ''))
+            if m and 1 <= int(m.group(1)) <= len(rhs):
+                self.copy_rules[index] = int(m.group(1)) - 1
+                if self.bypass_unit_rules and len(rhs) == 1 and self.is_non_terminal(rhs[0]):
+                    self.unit_rules.add(index)
+
+    def unit_goto(self, state: int, symbol: str, terminal: str) -> tuple[int, str]:
+        """
+        goto(state, symbol), followed through the unit rule reductions that the table would make next with terminal
+        as lookahead. Every such reduction pops the one symbol just pushed and goes from state again, so the chain
+        A -> B -> C ends in goto(state, A) with A on the stack. Results are memoized per (state, symbol, terminal).
+        """
+        key = (state, symbol, terminal)
+        found = self.unit_gotos.get(key)
+        if found is None:
+            table = self.parsing_table
+            target = table[(state, symbol)]
+            while True:
+                action = table.get((target, terminal))
+                if action is None or action[0] != 'r' or action[1] not in self.unit_rules:
+                    break
+                symbol = self.grammar_list[action[1]][0]
+                target = table[(state, symbol)]
+            found = self.unit_gotos[key] = target, symbol
+        return found
+
+    def scan(self, lexer: Lexer, state: int) -> Token:
+        """
+        The next token of lexer, lexed with only the terminals that state has an action for.
+        """
+        if self.expected is None:
+            expected = {}
+            for (name, symbol) in self.action_table:
+                if symbol != self.eof:
+                    expected.setdefault(name, set()).add(symbol)
+            self.expected = {name: frozenset(symbols) for name, symbols in expected.items()}
+        token = lexer.scan(self.expected.get(state, ()))
+        return token if token is not None else Token(self.eof, self.eof)
+
+    def locate(self, tokens, word: Token) -> str:
+        """
+        'line:column' of word in the source, '' when the tokens carry no offsets. The line index of the source is
+        only built when a location is asked for, that is on errors and in the parsing steps trace.
+        """
+        if isinstance(tokens, Lexer):
+            source, index = tokens.input, tokens.line_index
+            if word[0] == self.eof:
+                offset = len(source)
+            else:
+                offset = word.start if isinstance(word, SpanToken) else tokens.pos - len(word.value)
+        elif isinstance(tokens, TokenBatch):
+            source, index = tokens.source, tokens.line_index
+            offset = word.start if isinstance(word, SpanToken) else len(source)
+        elif isinstance(word, SpanToken):
+            source, index, offset = word.buffer, None, word.start
+            if self._line_index is not None and self._line_index[0] is source:
+                index = self._line_index[1]
+        else:
+            return ''
+        if index is None:
+            index = LineIndex(source)
+            self._line_index = source, index
+        return index.location(offset)
+
+    def parsing_step(self, stage: int, stack: list, tokens: list[Token], pos: int, location: str = '') -> list:
+        # stage,stack,symbols,input,location,action
+        stack_ = " ".join([str(s[0]) for s in stack])
+        symbol_ = " ".join([s[1] if isinstance(s[1], str) else s[1].type for s in stack])
+        # show at most 15 tokens
+        input_ = "".join([t.value for t in tokens[pos:pos + 15]])
+        return [stage, stack_, symbol_, input_, location]
+
     def print_parsing_steps(self, steps: list):
         x = PrettyTable()
         x.title = 'Parsing Steps'
-        x.field_names = ['STAGE', 'STACK', 'SYMBOLS', 'INPUT', 'ACTION']
+        x.field_names = ['STAGE', 'STACK', 'SYMBOLS', 'INPUT', 'LOCATION', 'ACTION']
         x.add_rows(steps)
         print(x)
@@ -1,30 +1,27 @@
-import copy
-
 from graphviz import Digraph
 
-from LR.LR0Parser import LR0Parser, Item0, LRState
+from LR.LR0Parser import LR0Parser, Item0, ItemTable, LRState
 
 
 class Item1(Item0):
-    def __init__(self, lhs: str, rule: tuple, pos: int, lookahead: str, eof_symbol: str = '$'):
-        super().__init__(lhs, rule, pos, eof_symbol)
-        self.lookahead = lookahead
+    __slots__ = ('lookahead',)
+
+    def __new__(cls, lhs: str, rule: tuple, pos: int, lookahead: str, eof_symbol: str = '$', table: ItemTable = None):
+        if table is None:
+            table = ItemTable()
+        return table.intern(cls, (lhs, rule if isinstance(rule, tuple) else tuple(rule), lookahead, eof_symbol), pos)
+
+    def _set(self, key: tuple, pos: int):
+        self.lhs, self.rule, self.lookahead, self.eof_symbol = key
+        self.pos = pos
 
     def __str__(self) -> str:
         s = [r for r in self.rule]
         s.insert(self.pos, ' . ')
         return f"{self.lhs} -> {''.join(s)}," + "{" + f"{','.join(self.lookahead)}" + "}"
 
-    def __key(self):
-        return self.lhs, self.rule, self.pos, self.lookahead
-
-    def __hash__(self):
-        return hash(self.__key())
-
-    def __eq__(self, other):
-        if isinstance(other, Item1):
-            return self.__key() == other.__key()
-        return False
+    def __reduce__(self):
+        return Item1, (self.lhs, self.rule, self.pos, self.lookahead, self.eof_symbol, self.table)
 
     def after_dot_next(self):
         if self.peek_dot_right() == self.eof_symbol:
@@ -37,22 +34,24 @@ class Item1(Item0):
         split LR1 item to LR0 item and lookahead symbol
         :return:
         """
-        return Item0(self.lhs, self.rule, self.pos, self.eof_symbol), self.lookahead
+        return Item0(self.lhs, self.rule, self.pos, self.eof_symbol, self.table), self.lookahead
 
 
 class LR1Parser(LR0Parser):
-    def __init__(self, bnf_file: str, eof: str = '$'):
-        super().__init__(bnf_file, eof)
+    def __init__(self, bnf_file: str, eof: str = '$', **kwargs):
+        super().__init__(bnf_file, eof, **kwargs)
 
     def augment_grammar(self):
         old_start = self.bnf_builder.start_symbol
         new_start = old_start + "'"
+        self.compiled = self.bnf_builder.build_grammar(self.eof).augment(new_start)
         self.grammar[new_start] = [[old_start]]
         self.non_terminals.add(new_start)
         self.start_symbol = new_start
         self.first_set[new_start] = self.first_set[old_start]
-        self.follow_set[new_start] = set(self.eof)
-        self.init_state = LRState(0, (self.closure([Item1(f"{new_start}", (old_start,), 0, self.eof)])))
+        self.follow_set[new_start] = {self.eof}
+        start_item = Item1(f"{new_start}", (old_start,), 0, self.eof, table=self.item_table)
+        self.init_state = LRState(0, (self.closure([start_item])))
         self.grammar_list.insert(0, (new_start, (old_start,)))
         self.semantic_action.insert(0, None)
 
@@ -71,20 +70,22 @@ class LR1Parser(LR0Parser):
         :param items:
         :return:
         """
-        result = set(copy.deepcopy(items))
+        result = set(items)
         is_change = True
         last_size = len(result)
+        compiled = self.compiled
 
         while is_change:
             new_items = set()
             for item in result:
                 next_i = item.peek_dot_right()
                 if self.is_non_terminal(next_i):
-                    for rule in self.grammar[next_i]:
+                    for p in compiled.nt_productions[compiled.symbol_ids[next_i]]:
+                        rule = compiled.productions[p][1]
                         after_next = item.after_dot_next()
                         first = self.get_first(after_next)
                         for f in first:
-                            i = Item1(next_i, rule, 0, f)
+                            i = Item1(next_i, rule, 0, f, table=self.item_table)
                             if i not in result:
                                 new_items.add(i)
             result |= new_items
@@ -99,7 +100,7 @@ class LR1Parser(LR0Parser):
     def get_first(self, symbols: list[str]) -> set[str]:
         first_set = set()
         for s in symbols:
-            first = self.first_set.get(s, set(s))
+            first = self.first_set.get(s, {s})
             if self.epsilon not in first:
                 first_set |= first
                 return first_set
@@ -0,0 +1,206 @@
+from collections import deque
+
+from LR.LR0Parser import LR0Parser, LRState
+from LR.LR1Parser import LR1Parser, Item1
+
+
+class PagerLR1Parser(LR1Parser):
+    """
+    Minimal LR(1) tables with Pager's algorithm. States are built on the fly as LR(0) kernels with a lookahead set per
+    kernel item; a new state is merged into an existing one with the same kernel when their lookaheads are weakly
+    compatible, which never introduces a conflict that the canonical LR(1) automaton does not have. The tables accept
+    the LR(1) language with about as many states as LALR(1). Like LALR1Parser, every state holds one Item1 per core
+    with the frozenset of its lookaheads as lookahead.
+    """
+
+    def __init__(self, bnf_file: str, eof: str = '$', **kwargs):
+        # (rule, pos) -> FIRST of rule[pos:] as a terminal bitset, and whether rule[pos:] is nullable
+        self.suffix_first = {}
+        # per nonterminal, see build_nt_spreads
+        self.nt_spreads = None
+        super().__init__(bnf_file, eof, **kwargs)
+
+    # the cores are LR(0) items
+    augment_grammar = LR0Parser.augment_grammar
+    closure = LR0Parser.closure
+
+    def first_of(self, rule: tuple, pos: int) -> tuple[int, bool]:
+        key = (rule, pos)
+        found = self.suffix_first.get(key)
+        if found is None:
+            ids = self.compiled.symbol_ids
+            first = 0
+            nullable = True
+            for symbol in rule[pos:]:
+                if symbol == self.epsilon:
+                    continue
+                symbol_first = self.first_set.get(symbol, {symbol})
+                for terminal in symbol_first:
+                    if terminal != self.epsilon:
+                        first |= 1 << ids[terminal]
+                if self.epsilon not in symbol_first:
+                    nullable = False
+                    break
+            found = self.suffix_first[key] = first, nullable
+        return found
+
+    def build_nt_spreads(self):
+        """
+        For every nonterminal A, what the items A -> . B β pass on to B: (B, FIRST(β) as a bitset, β nullable), merged
+        per B.
+        """
+        ids = self.compiled.symbol_ids
+        nt_count = self.compiled.nt_count
+        self.nt_spreads = []
+        for items in self.nt_items:
+            spreads = {}
+            for item in items:
+                symbol = ids.get(item.peek_dot_right(), nt_count)
+                if symbol < nt_count:
+                    first, nullable = self.first_of(item.rule, 1)
+                    old_first, old_nullable = spreads.get(symbol, (0, False))
+                    spreads[symbol] = old_first | first, old_nullable or nullable
+            self.nt_spreads.append([(symbol, first, nullable) for symbol, (first, nullable) in spreads.items()])
+
+    def lookahead_closure(self, kernel: dict) -> dict:
+        """
+        LR(1) closure of a kernel given as Item0 -> lookahead bitset, in the same form. Every B -> . γ gets the same
+        lookaheads, FIRST(β) of each A -> α . B β plus the lookaheads of those with β nullable, so the fixpoint runs
+        over nonterminals instead of items.
+        """
+        if self.nt_spreads is None:
+            if self.nt_reach is None:
+                self.build_nt_closures()
+            self.build_nt_spreads()
+        ids = self.compiled.symbol_ids
+        nt_count = self.compiled.nt_count
+        nt_lookaheads = {}
+        work_list = deque()
+        pending = set()
+        for item, lookahead in kernel.items():
+            symbol = ids.get(item.peek_dot_right(), nt_count)
+            if symbol < nt_count:
+                first, nullable = self.first_of(item.rule, item.pos + 1)
+                if nullable:
+                    first |= lookahead
+                old = nt_lookaheads.get(symbol, 0)
+                if first & ~old:
+                    nt_lookaheads[symbol] = old | first
+                    if symbol not in pending:
+                        pending.add(symbol)
+                        work_list.append(symbol)
+        while work_list:
+            symbol = work_list.popleft()
+            pending.discard(symbol)
+            lookahead = nt_lookaheads[symbol]
+            for target, first, nullable in self.nt_spreads[symbol]:
+                if nullable:
+                    first |= lookahead
+                old = nt_lookaheads.get(target, 0)
+                if first & ~old:
+                    nt_lookaheads[target] = old | first
+                    if target not in pending:
+                        pending.add(target)
+                        work_list.append(target)
+        items = dict(kernel)
+        # as in LR1Parser.closure, a nonterminal without lookaheads adds no items
+        for symbol, lookahead in nt_lookaheads.items():
+            for item in self.nt_items[symbol]:
+                items[item] = lookahead
+        return items
+
+    def successor_lookaheads(self, items: dict) -> dict:
+        """
+        symbol -> successor kernel as Item0 -> lookahead bitset, in grammar symbol order.
+        """
+        buckets = {}
+        for item, lookahead in items.items():
+            symbol = item.peek_dot_right()
+            if symbol != item.eof_symbol:
+                moved_item = item.move()
+                if moved_item:
+                    buckets.setdefault(symbol, {})[moved_item] = lookahead
+        order = self.compiled.symbol_ids
+        return {symbol: buckets[symbol] for symbol in sorted(buckets, key=lambda s: order.get(s, len(order)))}
+
+    @staticmethod
+    def weakly_compatible(old: dict, new: dict) -> bool:
+        """
+        Pager's weak compatibility of two lookahead bitset assignments to one kernel: for every pair of kernel items i
+        and j, the merge only mixes the lookaheads of i in one state with those of j in the other when i and j already
+        share a lookahead in one of the states.
+        """
+        items = list(old)
+        for a, i in enumerate(items):
+            for j in items[a + 1:]:
+                if (old[i] & new[j] or old[j] & new[i]) and not (old[i] & old[j] or new[i] & new[j]):
+                    return False
+        return True
+
+    def canonical_collection(self) -> tuple[list[LRState], dict[tuple:int]]:
+        self.init_state.kernel = self.init_kernel()
+        kernels = [{item: 1 << self.compiled.eof_id for item in self.init_state.kernel}]
+        # LR(0) kernel -> the states built on it
+        cores = {self.init_state.kernel: [0]}
+        trans_map = {}
+        work_list = [0]
+        pending = {0}
+
+        while len(work_list) > 0:
+            name = work_list.pop()
+            pending.discard(name)
+            for s, kernel in self.successor_lookaheads(self.lookahead_closure(kernels[name])).items():
+                core = frozenset(kernel)
+                candidates = cores.setdefault(core, [])
+                target = None
+                for t in candidates:
+                    if not any(kernel[i] & ~kernels[t][i] for i in core):
+                        target = t
+                        break
+                if target is None:
+                    for t in candidates:
+                        if self.weakly_compatible(kernels[t], kernel):
+                            # the merged state is done again to pass its new lookaheads on
+                            kernels[t] = {i: kernels[t][i] | kernel[i] for i in core}
+                            target = t
+                            break
+                    else:
+                        target = len(kernels)
+                        kernels.append(kernel)
+                        candidates.append(target)
+                    if target not in pending:
+                        pending.add(target)
+                        work_list.append(target)
+                trans_map[(name, s)] = target
+
+        # transitions redirected after a merge can leave states unreachable
+        out = {}
+        for (name, _), target in trans_map.items():
+            out.setdefault(name, []).append(target)
+        names = {0: 0}
+        order = [0]
+        for name in order:
+            for target in out.get(name, ()):
+                if target not in names:
+                    names[target] = len(names)
+                    order.append(target)
+        symbols = self.compiled.symbols
+        terminal_sets = {}
+        states = []
+        for name in order:
+            items = set()
+            for item, bits in self.lookahead_closure(kernels[name]).items():
+                lookahead = terminal_sets.get(bits)
+                if lookahead is None:
+                    lookahead = terminal_sets[bits] = frozenset(symbols[s] for s in range(bits.bit_length())
+                                                                if bits >> s & 1)
+                items.add(Item1(item.lhs, item.rule, item.pos, lookahead, table=self.item_table))
+            states.append(LRState(names[name], items, kernel=frozenset(kernels[name])))
+        trans_map = {(names[name], s): names[target] for (name, s), target in trans_map.items() if name in names}
+        self.lr0_states = states
+        self.lr0_trans_function = trans_map
+
+        return states, trans_map
+
+    def lookahead_symbols(self, item: [Item1]):
+        return item.lookahead
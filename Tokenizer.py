@@ -4,15 +4,18 @@ import re
 
 spec = [
     # white space
-    [r'^\s+', None],
+    [r'\s+', None],
     # comments,skip single line comments.
-    [r'^\/\/.*', None],
+    [r'\/\/.*', None],
     # skip multi line comments.
-    [r'^\/\*[\s\S]*?\*\/', None],
-    [r'^\d+', 'NUMBER'],
-    [r'^"[^"]*"|^\'[^\']*\'', 'STRING'],
+    [r'\/\*[\s\S]*?\*\/', None],
+    [r'\d+', 'NUMBER'],
+    [r'"[^"]*"|\'[^\']*\'', 'STRING'],
 ]
 
+# Patterns are matched in place at the cursor, so they are compiled once and never anchored with '^'.
+compiled_spec = [(re.compile(reg), token_type) for reg, token_type in spec]
+
 
 class Tokenizer:
     def __init__(self, string):
@@ -24,24 +27,22 @@ class Tokenizer:
         Obtain next token
         :return:
         """
-        if not self.has_more_tokens():
-            return None
-
-        string = self._string[self._cursor:]
+        while self.has_more_tokens():
+            for reg, token_type in compiled_spec:
+                token = self.match(reg)
+                # couldn't match rule,continue
+                if token is None:
+                    continue
 
-        for reg, token_type in spec:
-            token = self.match(reg, string)
-            # couldn't match rule,continue
-            if token is None:
-                continue
+                # should skip token. e.g white space
+                if token_type is None:
+                    break
 
-            # should skip token. e.g white space
-            if token_type is None:
-                return self.get_next_token()
+                return {"type": token_type, "value": token}
+            else:
+                raise SyntaxError(f'Unexpected token:{self._string[self._cursor]}')
 
-            return {"type": token_type, "value": token}
-
-        raise SyntaxError(f'Unexpected token:{string[0]}')
+        return None
 
     # Whether still have more tokens.
     def has_more_tokens(self):
@@ -50,10 +51,10 @@ class Tokenizer:
     def is_eof(self):
         return len(self._string) == self._cursor
 
-    def match(self, reg, string):
-        m = re.search(reg, string)
+    def match(self, reg):
+        m = reg.match(self._string, self._cursor)
         if m:
             token = m.group()
-            self._cursor += len(token)
+            self._cursor = m.end()
             return token
         return None
@@ -0,0 +1,35 @@
+# Tokenizer scaling benchmark.
+# Run from the repository root: python -m bench.bench_tokenizer [max_size]
+import sys
+import time
+
+from Tokenizer import Tokenizer
+
+SIZES = [1 << 10, 10 << 10, 100 << 10, 1 << 20, 10 << 20, 50 << 20]
+
+UNIT = '42 "hello" // line comment\n/* block\n comment */ \'world\'   7\n'
+
+
+def make_input(size):
+    text = UNIT * (size // len(UNIT))
+    return text + ' ' * (size - len(text))
+
+
+def run(size):
+    text = make_input(size)
+    tokenizer = Tokenizer(text)
+    count = 0
+    start = time.perf_counter()
+    while tokenizer.get_next_token() is not None:
+        count += 1
+    return count, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1]
+    print(f"{'bytes':>12} {'tokens':>10} {'seconds':>10} {'ns/byte':>10}")
+    for size in SIZES:
+        if size > max_size:
+            break
+        count, elapsed = run(size)
+        print(f"{size:>12} {count:>10} {elapsed:>10.4f} {elapsed * 1e9 / size:>10.1f}")
@@ -1,6 +1,10 @@
+import os
+import random
+import tempfile
 import unittest
 
 from util.BnfBuilder import BnfBuilder
+from util.Digraph import digraph
 
 
 class LL1Test(unittest.TestCase):
@@ -22,3 +26,83 @@ class LL1Test(unittest.TestCase):
         v = {"p1": 2, "p2": "+", "p3": 5, "result": None}
         exec(semantic_action, v)
         print(v.get('result'))
+
+    def test3(self):
+        grammar = {
+            'S': [['A', 'B', 'c'], ['B', 'S']],
+            'A': [['a'], ['eps']],
+            'B': [['A', 'A'], ['b']],
+        }
+        first = BnfBuilder.first(grammar, epsilon_symbol='eps')
+        self.assertEqual({'a', 'b', 'c'}, first['S'])
+        self.assertEqual({'a', 'eps'}, first['A'])
+        self.assertEqual({'a', 'b', 'eps'}, first['B'])
+        follow = BnfBuilder.follow(grammar, first, set(grammar), 'S', epsilon_symbol='eps')
+        self.assertEqual({'$'}, follow['S'])
+        # B is followed by c, by FIRST(S), and A by everything that follows B since A can end B
+        self.assertEqual({'a', 'b', 'c'}, follow['B'])
+        self.assertEqual({'a', 'b', 'c'}, follow['A'])
+
+    def test4(self):
+        for bnf in ['g5.bnf', 'g6.bnf', 'g7.bnf', 'g8.bnf', 'g9.bnf', 'g10.bnf']:
+            sets = []
+            for analysis in ('worklist', 'scc'):
+                builder = BnfBuilder(bnf, analysis=analysis)
+                builder.build()
+                builder.build_first_set()
+                builder.build_follow_set()
+                sets.append((builder.first_set, builder.follow_set))
+            self.assertEqual(sets[0], sets[1])
+        self.assertEqual(len(builder.non_terminals), len(builder.first_graph))
+
+    def test5(self):
+        rand = random.Random(9)
+        for _ in range(100):
+            nts = list(range(rand.randint(1, 8)))
+            rules = [(rand.choice(nts), [rand.randrange(len(nts) + 3) for _ in range(rand.randint(0, 3))])
+                     for _ in range(rand.randint(1, 15))]
+            first, nullable = BnfBuilder.first_bits(rules, len(nts))
+            self.assertEqual(nullable, BnfBuilder.nullable_bits(rules, len(nts)))
+            edges, initial = BnfBuilder.first_dependencies(rules, len(nts), nullable)
+            self.assertEqual(first, digraph(edges, initial))
+            eof = len(nts) + 3
+            follow = BnfBuilder.follow_bits(rules, len(nts), first, nullable, 0, eof)
+            edges, initial = BnfBuilder.follow_dependencies(rules, len(nts), first, nullable, 0, eof)
+            self.assertEqual(follow, digraph(edges, initial))
+
+    def test6(self):
+        # the ::= format of LR/bnf.py, with quoted terminals
+        builder = BnfBuilder('../LR/grammar.bnf', prod_delimiter='::=')
+        builder.build()
+        self.assertEqual('<expr>', builder.start_symbol)
+        self.assertEqual({'<expr>', '<term>', '<factor>', '<exponent>'}, builder.non_terminals)
+        self.assertEqual({'+', '-', '*', '/', '%', '^', '(', ')', 'num'}, builder.terminals)
+        self.assertEqual(('<exponent>', ('(', '<expr>', ')')), builder.grammar_list[-2])
+        self.assertEqual(11, len(builder.grammar_list))
+        # ::= is only a delimiter when asked for
+        with self.assertRaises(AssertionError):
+            BnfBuilder('../LR/grammar.bnf').build()
+
+    def test7(self):
+        # primed nonterminals are bare symbols, quoted terminals lose their quotes like in shlex.split
+        text = ("E -> T E'\n"
+                "E' -> '+' T E'\n"
+                "    | \"-\" T E'\n"
+                "    | ε\n"
+                "T -> '(' E ')'\n"
+                "    | \"a b\"'c'\n"
+                "    | \"\\\"\"\n")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'primed.bnf')
+            with open(path, 'w') as f:
+                f.write(text)
+            builder = BnfBuilder(path)
+            builder.build()
+            self.assertEqual({'E', "E'", 'T'}, builder.non_terminals)
+            self.assertEqual({'+', '-', '(', ')', 'a bc', '"'}, builder.terminals)
+            self.assertEqual([("E'", ('+', 'T', "E'")), ("E'", ('-', 'T', "E'")), ("E'", ('ε',))],
+                             builder.grammar_list[1:4])
+            with open(path, 'a') as f:
+                f.write("    | 'x\n")
+            with self.assertRaises(AssertionError):
+                BnfBuilder(path).build()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from LR.SLR1Parser import SLR1Parser
+from util.DfaLexer import DfaLexer, DfaTable, build_dfa
+from util.Lexer import Lexer
+
+token_exprs = [
+    (r'[ \n\t]+', None),
+    (r'#[^\n]*', None),
+    (r'[-]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?', 'NUMBER'),
+    (r'\(', '('),
+    (r'\)', ')'),
+    (r'\+', '+'),
+    (r'\-', '-'),
+    (r'\*', '*'),
+    (r'\/', '/'),
+    (r'[a-zA-Z_][a-zA-Z0-9_]*', 'IDENTIFIER'),
+]
+
+
+class DfaLexerTest(unittest.TestCase):
+    def test1(self):
+        text = '3.6 + 4e-2   *   (2 -1) / aa # comment\n - x_1'
+        lexer = Lexer(text, token_exprs)
+        expected = []
+        while lexer.has_next():
+            token = lexer.next()
+            expected.append((token.type, token.value))
+        tokens = DfaLexer(build_dfa(token_exprs)).tokenize(text)
+        self.assertEqual(expected, [(t.type, t.value) for t in tokens])
+
+    def test2(self):
+        table = build_dfa(token_exprs)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dfa.json')
+            table.dump(path)
+            loaded = DfaTable.load(path)
+        self.assertEqual(table.table, loaded.table)
+        self.assertEqual(['NUMBER', '+', 'NUMBER'], [t.type for t in DfaLexer(loaded).tokenize('1 + 2')])
+
+    def test3(self):
+        # longest match wins, then the first rule
+        table = build_dfa([(r'if', 'IF'), (r'[a-z]+', 'ID'), (r'/\*[\s\S]*?\*/', None), (r'\s+', None)])
+        tokens = DfaLexer(table).tokenize('if iffy /* a */ b /* c */')
+        self.assertEqual([('IF', 'if'), ('ID', 'iffy'), ('ID', 'b')], [(t.type, t.value) for t in tokens])
+        self.assertRaises(ValueError, lambda: DfaLexer(table).tokenize('if 1'))
+        self.assertRaises(ValueError, build_dfa, [(r'^a', 'A')])
+
+    def test4(self):
+        parser = SLR1Parser('g5.bnf')
+        parser.canonical_collection()
+        parser.build_parse_table()
+        parser.parse(DfaLexer(build_dfa(token_exprs)).tokenize('1+2*(3 - 4)', eof='$'))
+        self.assertEqual('BinaryExpression', parser.ast['type'])
@@ -0,0 +1,34 @@
+import random
+import unittest
+
+from util.Digraph import digraph, strongly_connected
+
+
+class DigraphTest(unittest.TestCase):
+    def test1(self):
+        edges = [[1], [2], [0, 3], [4], [3], []]
+        components = strongly_connected(edges)
+        self.assertEqual([[0, 1, 2], [3, 4], [5]], sorted(sorted(c) for c in components))
+        # every edge leaving a component points to one listed before it
+        order = {x: i for i, c in enumerate(components) for x in c}
+        for x, successors in enumerate(edges):
+            for y in successors:
+                self.assertLessEqual(order[y], order[x])
+
+    def test2(self):
+        rand = random.Random(5)
+        for _ in range(50):
+            n = rand.randint(1, 30)
+            edges = [rand.sample(range(n), rand.randint(0, min(n, 3))) for _ in range(n)]
+            initial = [1 << rand.randrange(8) for _ in range(n)]
+            # the fixpoint, by iterating until nothing changes
+            expected = list(initial)
+            changed = True
+            while changed:
+                changed = False
+                for x in range(n):
+                    for y in edges[x]:
+                        if expected[y] & ~expected[x]:
+                            expected[x] |= expected[y]
+                            changed = True
+            self.assertEqual(expected, digraph(edges, initial))
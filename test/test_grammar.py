@@ -0,0 +1,61 @@
+import unittest
+
+from LL import LL1
+from util.BnfBuilder import BnfBuilder
+from util.Grammar import Grammar
+from util.Lexer import Lexer
+
+
+class GrammarTest(unittest.TestCase):
+    def test1(self):
+        builder = BnfBuilder('g7.bnf')
+        builder.build()
+        grammar = builder.build_grammar()
+        self.assertIs(grammar, builder.build_grammar())
+        self.assertEqual(1, grammar.nt_count)
+        self.assertEqual('$', grammar.symbols[grammar.eof_id])
+        self.assertEqual(range(0, 6), grammar.nt_productions[0])
+        ids = grammar.symbol_ids
+        self.assertEqual([ids['E'], ids['+'], ids['E']], list(grammar.rhs(0)))
+        self.assertEqual(5, grammar.production_index[('E', ('NUMBER',))])
+        self.assertEqual((1, 'left'), grammar.precedence['*'])
+        self.assertEqual((0, 'left'), grammar.production_precedence[1])
+        augmented = grammar.augment()
+        self.assertEqual("E'", augmented.start_symbol)
+        self.assertEqual(("E'", ('E',)), augmented.productions[0])
+        self.assertEqual(6, augmented.production_index[('E', ('NUMBER',))])
+
+    def test2(self):
+        grammar = Grammar([('S', ('A', 'b')), ('A', ('a',)), ('S', ('c',)), ('A', ('ε',))], 'S')
+        self.assertEqual((0, 2), grammar.nt_productions[0])
+        self.assertEqual(0, grammar.rhs_len(3))
+        # the production with precedence (None, None) has a terminal without a precedence level
+        self.assertEqual((None, None), grammar.production_precedence[0])
+        table = LL1.parsing_table(grammar)
+        ids = grammar.symbol_ids
+        self.assertEqual({ids['a']: 0, ids['b']: 0, ids['c']: 2}, table[ids['S']])
+        self.assertEqual({ids['a']: 1, ids['b']: 3}, table[ids['A']])
+        # S -> A b starts with A; A -> ε starts with nothing
+        self.assertEqual([[ids['A']], []], grammar.left_corners())
+
+    def test3(self):
+        # the LL(1) engine on a compiled Grammar
+        grammar = LL1.grammar_of(LL1.grammar, LL1.start_symbol)
+        table = LL1.parsing_table(grammar)
+        ids = grammar.symbol_ids
+        self.assertEqual(grammar.production_index[("T'", ('ε',))], table[ids["T'"]][ids['+']])
+        for text, accepted in [('(3 + 4 )*(4+1)', True), ('2', True), ('(3 + 4', False), ('3 4', False)]:
+            lexer = Lexer(text, LL1.token_exprs)
+            inputs = []
+            while lexer.has_next():
+                inputs.append(lexer.next().type)
+            self.assertEqual(accepted, LL1.parse(grammar, table, inputs))
+
+    def test4(self):
+        # FIRST/FOLLOW of BnfBuilder are computed over the symbol ids of its Grammar
+        builder = BnfBuilder('g7.bnf')
+        builder.build()
+        builder.build_follow_set()
+        grammar = builder.build_grammar()
+        self.assertIs(grammar, builder.interned[0])
+        self.assertEqual({'$', '+', '-', '*', '/', ')'}, builder.follow_set['E'])
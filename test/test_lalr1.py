@@ -1,6 +1,9 @@
+import os
+import tempfile
 import unittest
 
 from LR.LALR1Parser import LALR1Parser
+from LR.LR1Parser import LR1Parser
 from util.Lexer import Lexer, Token
 
 
@@ -64,4 +67,28 @@ class LALR1Test(unittest.TestCase):
             inputs.append(lexer.next())
         inputs.append(Token('$', '$'))
 
-        parser.parse(inputs)
\ No newline at end of file
+        parser.parse(inputs)
+
+    def test4(self):
+        # the lookaheads found on the LR(0) automaton are those of the LR(1) states merged by core
+        with tempfile.TemporaryDirectory() as directory:
+            nullable = os.path.join(directory, 'nullable.bnf')
+            with open(nullable, 'w') as f:
+                f.write('S -> A B c\n | B d\nA -> a A\n | ε\nB -> b\n | A\n')
+            for grammar in ('g5.bnf', 'g9.bnf', nullable):
+                lr1 = LR1Parser(grammar)
+                merged = {}
+                for state in lr1.canonical_collection()[0]:
+                    items = {}
+                    for item in state.items:
+                        item0, lookahead = item.split()
+                        items.setdefault(item0, set()).add(lookahead)
+                    core = merged.setdefault(frozenset(items), {})
+                    for item0, lookaheads in items.items():
+                        core.setdefault(item0, set()).update(lookaheads)
+                lalr = LALR1Parser(grammar)
+                states, _ = lalr.canonical_collection()
+                self.assertEqual(len(merged), len(states))
+                for state in states:
+                    items = {item.split()[0]: set(item.lookahead) for item in state.items}
+                    self.assertEqual(merged[frozenset(items)], items)
@@ -0,0 +1,225 @@
+import random
+import unittest
+from unittest import mock
+
+from util.Lexer import Lexer, SpanToken, TokenSpec, get_spec
+from util.LineIndex import LineIndex
+
+token_exprs = [
+    (r'[ \n\t]+', None),
+    (r'#[^\n]*', None),
+    (r'[-]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?', 'NUMBER'),
+    (r'\(', '('),
+    (r'\)', ')'),
+    (r'\+', '+'),
+    (r'\-', '-'),
+    (r'\*', '*'),
+    (r'\/', '/'),
+    (r'[a-zA-Z_][a-zA-Z0-9_]*', 'IDENTIFIER'),
+]
+
+
+def lex(text):
+    lexer = Lexer(text, token_exprs)
+    tokens = []
+    while lexer.has_next():
+        token = lexer.next()
+        tokens.append((token.type, token.value))
+    return tokens
+
+
+class LexerTest(unittest.TestCase):
+    def test1(self):
+        self.assertEqual([('NUMBER', '3.6'), ('+', '+'), ('NUMBER', '4'), ('*', '*'), ('(', '('),
+                          ('NUMBER', '2'), ('NUMBER', '-1'), (')', ')'), ('/', '/'), ('IDENTIFIER', 'aa')],
+                         lex('3.6 + 4   *   (2 -1) / aa'))
+
+    def test2(self):
+        # comments and trailing white space are skipped
+        self.assertEqual([('NUMBER', '1'), ('+', '+'), ('NUMBER', '2')], lex('1 # one\n + 2 # two\n  '))
+
+    def test3(self):
+        self.assertIs(get_spec(token_exprs), get_spec(list(token_exprs)))
+
+    def test4(self):
+        lexer = Lexer('1 ? 2', token_exprs)
+        self.assertEqual('1', lexer.next().value)
+        self.assertRaises(ValueError, lexer.next)
+
+    def test5(self):
+        text = '3.6 + 4 # four\n * (2 - 1) / aa'
+        batch = Lexer(text, token_exprs).tokenize_bulk(eof='$')
+        self.assertEqual(lex(text) + [('$', '$')], [(t.type, t.value) for t in batch])
+        self.assertEqual('H', batch.types.typecode)
+        self.assertEqual((0, 3), (batch.starts[0], batch.ends[0]))
+        self.assertEqual('aa', batch.value(len(batch) - 2))
+        self.assertEqual(['NUMBER', '+'], [t.type for t in batch[0:2]])
+
+    def test6(self):
+        text = '3.6 + 4 * aa'
+        lexer = Lexer(text, token_exprs, span=True)
+        token = lexer.next()
+        self.assertEqual((0, 3, None), (token.start, token.end, token._value))
+        self.assertEqual('3.6', token.value)
+        self.assertIs(token.value, token.value)
+        self.assertEqual(lex(text)[1:], [(t.type, t.value) for t in iter(lexer.next, None)])
+
+    def test7(self):
+        buffer = memoryview(b'abc def')
+        self.assertEqual(['abc', 'def'], [SpanToken('ID', buffer, 0, 3).value, SpanToken('ID', buffer, 4, 7).value])
+
+    def test8(self):
+        text = '3.6 + 4 # four\n * (2 - 1) / aa'
+        for source in (text.encode(), memoryview(text.encode())):
+            batch = Lexer(source, token_exprs).tokenize_bulk()
+            self.assertEqual(lex(text), [(t.type, t.value) for t in batch])
+
+    def test9(self):
+        lexer = Lexer('1 + 2 * 3', token_exprs, lookahead=3)
+        self.assertEqual(['1', '+', '2'], [lexer.peek(k).value for k in (1, 2, 3)])
+        self.assertRaises(ValueError, lexer.peek, 4)
+        self.assertEqual('1', lexer.advance().value)
+        marker = lexer.mark()
+        self.assertEqual(['+', '2', '*', '3'], [t.value for t in iter(lexer.advance, None)])
+        self.assertIsNone(lexer.peek(2))
+        lexer.reset(marker)
+        self.assertEqual('*', lexer.peek(3).value)
+        self.assertEqual(['+', '2', '*', '3'], [t.value for t in iter(lexer.advance, None)])
+
+    def test10(self):
+        # illegal input is an error, not the end of input
+        lexer = Lexer('1 ?', token_exprs)
+        self.assertTrue(lexer.has_next())
+        lexer.next()
+        self.assertRaises(ValueError, lexer.has_next)
+
+    def test11(self):
+        text = '1 + 22 * (3 - x) # note\n / 4'
+        lexer = Lexer(text, token_exprs)
+        batch = lexer.tokenize_bulk(eof='$')
+        for start, old_len, new_text in ((5, 1, '3'), (0, 0, 'abc '), (9, 9, ''), (2, 0, '+'), (28, 1, 'y z')):
+            text = text[:start] + new_text + text[start + old_len:]
+            batch = lexer.relex(batch, start, old_len, new_text)
+            self.assertEqual(text, batch.source)
+            expected = Lexer(text, token_exprs).tokenize_bulk(eof='$')
+            self.assertEqual((expected.types, expected.starts, expected.ends), (batch.types, batch.starts, batch.ends))
+
+    def test12(self):
+        lexer = Lexer('1 x y', token_exprs)
+        self.assertEqual('NUMBER', lexer.scan({'NUMBER'}).type)
+        # an unexpected token is still lexed, with the whole spec
+        self.assertEqual('IDENTIFIER', lexer.scan({'NUMBER'}).type)
+        self.assertEqual('IDENTIFIER', lexer.scan({'IDENTIFIER'}).type)
+        self.assertIsNone(lexer.scan({'NUMBER'}))
+
+    def test13(self):
+        text = '1 +\n\n  22 # note\n*x'
+        index = LineIndex(text)
+        self.assertEqual(4, len(index))
+        self.assertEqual((1, 1), index.line_col(0))
+        self.assertEqual((1, 4), index.line_col(3))
+        self.assertEqual((2, 1), index.line_col(4))
+        self.assertEqual((3, 3), index.line_col(7))
+        self.assertEqual((4, 2), index.line_col(len(text) - 1))
+        self.assertEqual(index.starts, LineIndex(text.encode()).starts)
+        self.assertEqual('I', index.starts.typecode)
+        # past 4 GiB the offsets no longer fit in 32 bits
+        with mock.patch.object(LineIndex, 'SMALL_LIMIT', 8):
+            large = LineIndex(text)
+            large_batch = Lexer(text, token_exprs).tokenize_bulk()
+        self.assertEqual('Q', large.starts.typecode)
+        self.assertEqual(list(index.starts), list(large.starts))
+        batch = Lexer(text, token_exprs).tokenize_bulk()
+        # token offsets take the same typecode as the line starts
+        self.assertEqual(('I', 'Q'), (batch.starts.typecode, large_batch.starts.typecode))
+        self.assertEqual((list(batch.starts), list(batch.ends)), (list(large_batch.starts), list(large_batch.ends)))
+        with mock.patch.object(LineIndex, 'SMALL_LIMIT', len(text) + 1):
+            lexer = Lexer(text, token_exprs)
+            grown = lexer.relex(lexer.tokenize_bulk(), 0, 0, '1 ')
+        self.assertEqual(('Q', 'Q'), (grown.starts.typecode, grown.ends.typecode))
+        self.assertEqual([(1, 1), (1, 3), (3, 3), (4, 1), (4, 2)], [batch.line_col(i) for i in range(len(batch))])
+
+    def test14(self):
+        # a match may depend on text far past its end: restart before any comment or string that reaches the edit
+        exprs = [
+            (r'[ \n\t]+', None),
+            (r'/\*[\s\S]*?\*/', None, True),
+            (r'"(?:\\.|[^"\\])*"', 'STRING', True),
+            (r'"', 'QUOTE'),
+            (r'\\', 'BACKSLASH'),
+        ] + token_exprs[1:]
+        text = '/* 1 + 2 + 3 + 4 +'
+        lexer = Lexer(text, exprs)
+        batch = lexer.relex(lexer.tokenize_bulk(), len(text), 0, ' */')
+        self.assertEqual(0, len(batch))
+        pieces = ['1', 'x', ' ', '\n', '+', '/', '*', '/*', '*/', '"', '\\', '# c\n', '(', ')']
+        rng = random.Random(7)
+        for _ in range(300):
+            text = ''.join(rng.choice(pieces) for _ in range(rng.randrange(40)))
+            lexer = Lexer(text, exprs)
+            batch = lexer.tokenize_bulk(eof='$')
+            for _ in range(5):
+                start = rng.randrange(len(text) + 1)
+                old_len = rng.randrange(len(text) - start + 1)
+                new_text = ''.join(rng.choice(pieces) for _ in range(rng.randrange(4)))
+                text = text[:start] + new_text + text[start + old_len:]
+                batch = lexer.relex(batch, start, old_len, new_text)
+                expected = Lexer(text, exprs).tokenize_bulk(eof='$')
+                self.assertEqual((expected.types, expected.starts, expected.ends),
+                                 (batch.types, batch.starts, batch.ends))
+
+    def test15(self):
+        # a pattern that matches empty makes no token: the later patterns are tried, as one by one
+        exprs = [(r'[ \t]*', None), (r'\d+', 'NUM'), (r'\+', 'PLUS'), (r'x?', 'X')]
+        lexer = Lexer('1 + 2', exprs)
+        tokens = []
+        while lexer.has_next():
+            tokens.append(lexer.next().value)
+        self.assertEqual(['1', '+', '2'], tokens)
+        lexer = Lexer('1 +x 2', exprs)
+        batch = lexer.tokenize_bulk()
+        self.assertEqual(['1', '+', 'x', '2'], [batch.value(i) for i in range(len(batch))])
+        batch = lexer.relex(batch, 1, 0, '2 + 3')
+        self.assertEqual(['12', '+', '3', '+', 'x', '2'], [batch.value(i) for i in range(len(batch))])
+        self.assertEqual(['NUM'], [t.type for t in iter(Lexer(b'1 ', exprs).advance, None)])
+        self.assertRaises(ValueError, Lexer('1 ?', exprs).tokenize_bulk)
+
+    def test16(self):
+        # relex only looks around the edit: attempts that look past their line are recorded in the batch
+        exprs = [
+            (r'[ \n\t]+', None),
+            (r'/\*[\s\S]*?\*/', None, True),
+            (r'"(?:\\.|[^"\\])*"', 'STRING', True),
+            (r'"', 'QUOTE'),
+            (r'=', '='),
+        ] + token_exprs[1:]
+        lines = [f'x{i} = {i} / 2 "s" # c\n' for i in range(2000)]
+        text = ''.join(lines[:1500]) + '/* open\n' + ''.join(lines[1500:])
+        lexer = Lexer(text, exprs)
+        batch = lexer.tokenize_bulk(eof='$')
+        self.assertEqual([len(''.join(lines[:1500]))], list(batch.attempts))
+        regex = lexer.regex
+        calls = []
+
+        class Counting:
+            def match(self, *args):
+                calls.append(args[1])
+                return regex.match(*args)
+
+        for start, new_text in ((len(''.join(lines[:1000])), 'y'), (len(text), '*/ y')):
+            calls.clear()
+            lexer.regex = Counting()
+            with mock.patch.object(TokenSpec, 'spanning_skip', side_effect=AssertionError):
+                batch = lexer.relex(batch, start, 0, new_text)
+            text = text[:start] + new_text + text[start:]
+            lexer.regex = regex
+            expected = Lexer(text, exprs).tokenize_bulk(eof='$')
+            self.assertEqual((expected.types, expected.starts, expected.ends, expected.attempts),
+                             (batch.types, batch.starts, batch.ends, batch.attempts))
+            if new_text == 'y':
+                # the line of the edit
+                self.assertLess(len(calls), 20)
+            else:
+                # from the line of the comment left open, which the edit closes
+                opener = len(''.join(lines[:1500]))
+                self.assertTrue(opener - len(lines[1499]) < min(calls) <= opener)
@@ -1,6 +1,6 @@
 import unittest
 
-from LL.LL1 import eliminateLeftRecursion, first, follow, parsing_table, parse
+from LL.LL1 import eliminateLeftRecursion, first, follow, grammar_of, parsing_table, parse
 from util.Lexer import Lexer
 
 
@@ -57,14 +57,16 @@ class LL1Test(unittest.TestCase):
             'F': [['NUMBER', ], ['(', 'E', ')']]
 
         }
-        non_terminal = {'E', "E'", 'T', "T'", 'F'}
         start_symbol = 'E'
-        first_set = first(grammar, non_terminal)
+        compiled = grammar_of(grammar, start_symbol)
+        first_set = first(compiled)
         print('first set:', first_set)
-        follow_set = follow(grammar, non_terminal, first_set)
+        self.assertEqual({'+', 'ε'}, first_set["E'"])
+        follow_set = follow(compiled)
         print('follow set:', follow_set)
+        self.assertEqual({'+', ')', '$'}, follow_set["T'"])
 
-        table = parsing_table(grammar, first_set, follow_set)
+        table = parsing_table(compiled)
         print('parsing table', table)
 
         text = '2'
@@ -73,5 +75,6 @@ class LL1Test(unittest.TestCase):
         while lexer.has_next():
             inputs.append(lexer.next().type)
         print(inputs)
-        accepted = parse(start_symbol, table, inputs)
+        accepted = parse(compiled, table, inputs)
         print(accepted)
+        self.assertTrue(accepted)
@@ -1,6 +1,8 @@
+import copy
+import pickle
 import unittest
 
-from LR.LR0Parser import LR0Parser, Item0, LRState
+from LR.LR0Parser import LR0Parser, Item0, ItemTable, LRState
 from util.Lexer import Lexer, Token
 
 
@@ -60,4 +62,55 @@ class LR0Test(unittest.TestCase):
             inputs.append(lexer.next())
         inputs.append(Token('$', '$'))
 
-        parser.parse(inputs)
\ No newline at end of file
+        parser.parse(inputs)
+
+    def test8(self):
+        parser = LR0Parser('g5.bnf')
+        states, trans = parser.canonical_collection()
+        # states are told apart by their kernels, and each is the closure of its kernel
+        self.assertEqual(len(states), len({s.kernel for s in states}))
+        self.assertEqual(len(states), len({frozenset(s.items) for s in states}))
+        for s in states:
+            self.assertEqual(parser.closure(list(s.kernel)), s.items)
+            # closures are memoized per kernel
+            self.assertIs(parser.closure(list(s.kernel)), parser.closure(list(s.kernel)))
+        for (name, symbol), target in trans.items():
+            self.assertEqual(states[target].kernel, parser.goto_kernel(states[name], symbol))
+
+    def test9(self):
+        table = ItemTable()
+        item = Item0('E', ['E', '+', 'T'], 0, table=table)
+        # items are interned, and moving the dot steps to the next code
+        self.assertIs(item, Item0('E', ('E', '+', 'T'), 0, table=table))
+        moved = item.move()
+        self.assertIs(moved, Item0('E', ('E', '+', 'T'), 1, table=table))
+        self.assertEqual(item.code + 1, moved.code)
+        self.assertEqual('+', moved.peek_dot_right())
+        self.assertIsNone(moved.move().move().move())
+        self.assertIs(item, copy.deepcopy(item))
+        # unpickled items share a new table
+        loaded, loaded_moved = pickle.loads(pickle.dumps([item, moved]))
+        self.assertIsNot(item, loaded)
+        self.assertEqual(item, loaded)
+        self.assertEqual(hash(item), hash(loaded))
+        self.assertNotEqual(item, loaded_moved)
+        self.assertIs(loaded_moved, loaded.move())
+        # the table belongs to the parser
+        parsers = [LR0Parser('g7.bnf') for _ in range(2)]
+        self.assertIsNot(parsers[0].item_table, parsers[1].item_table)
+        for parser in parsers:
+            self.assertTrue(all(i.table is parser.item_table for i in parser.init_state.items))
+
+    def test10(self):
+        parser = LR0Parser('g7.bnf')
+        states, trans = parser.canonical_collection()
+        for s in states:
+            symbols = s.next_symbols()
+            self.assertEqual(len(symbols), len(set(symbols)))
+            # one bucket per symbol after a dot, in grammar order
+            successors = parser.successor_kernels(s)
+            self.assertEqual(sorted(symbols, key=parser.compiled.symbol_ids.get), list(successors))
+            for symbol, kernel in successors.items():
+                self.assertEqual(parser.goto_kernel(s, symbol), kernel)
+        # the numbering is the same on every build
+        self.assertEqual(trans, LR0Parser('g7.bnf').canonical_collection()[1])
@@ -0,0 +1,73 @@
+import unittest
+
+from LR.LALR1Parser import LALR1Parser
+from LR.LR1Parser import LR1Parser
+from LR.PagerLR1Parser import PagerLR1Parser
+from util.Lexer import Lexer
+
+
+class PagerLR1Test(unittest.TestCase):
+    def test1(self):
+        # g11 is LR(1) but not LALR(1): merging the two states reached by c gives a reduce/reduce conflict
+        with self.assertRaises(AssertionError):
+            parser = LALR1Parser('g11.bnf')
+            parser.canonical_collection()
+            parser.build_parse_table()
+        parser = PagerLR1Parser('g11.bnf')
+        states, _ = parser.canonical_collection()
+        parser.build_parse_table()
+        self.assertEqual(len(LR1Parser('g11.bnf').canonical_collection()[0]), len(states))
+        token_exprs = [
+            (r'[ \n\t]+', None),
+            (r'a', 'a'),
+            (r'b', 'b'),
+            (r'c', 'c'),
+            (r'd', 'd'),
+            (r'e', 'e'),
+        ]
+        for text in ('a c d', 'b c d', 'a c e', 'b c e'):
+            parser.parse(Lexer(text, token_exprs).tokenize_bulk(eof='$'))
+        with self.assertRaises(AssertionError):
+            parser.parse(Lexer('a c c', token_exprs).tokenize_bulk(eof='$'))
+
+    def test2(self):
+        # on LALR(1) grammars the states are merged down to the LALR(1) automaton
+        for grammar in ('g5.bnf', 'g7.bnf', 'g9.bnf'):
+            parser = PagerLR1Parser(grammar)
+            states, _ = parser.canonical_collection()
+            parser.build_parse_table()
+            self.assertEqual(len(LALR1Parser(grammar).canonical_collection()[0]), len(states))
+            self.assertLess(len(states), len(LR1Parser(grammar).canonical_collection()[0]))
+
+    def test3(self):
+        token_exprs = [
+            (r'[ \n\t]+', None),
+            (r'[0-9]+', 'NUMBER'),
+            (r'\(', '('),
+            (r'\)', ')'),
+            (r'\+', '+'),
+            (r'\-', '-'),
+            (r'\*', '*'),
+            (r'\/', '/'),
+        ]
+        text = '1 + 2 * (3 - 4) / 5 - 6'
+        asts = []
+        for engine in (LR1Parser, PagerLR1Parser):
+            parser = engine('g5.bnf')
+            parser.canonical_collection()
+            parser.build_parse_table()
+            parser.parse(Lexer(text, token_exprs).tokenize_bulk(eof='$'))
+            asts.append(parser.ast)
+        self.assertEqual(asts[0], asts[1])
+
+    def test4(self):
+        # kernel items S -> a . A and S -> a . B of two states
+        i, j = 'i', 'j'
+        self.assertTrue(PagerLR1Parser.weakly_compatible({i: 0b01, j: 0b10}, {i: 0b01, j: 0b10}))
+        # i would get the lookahead of j and the reverse: only when they already share one
+        self.assertFalse(PagerLR1Parser.weakly_compatible({i: 0b01, j: 0b10}, {i: 0b10, j: 0b01}))
+        self.assertTrue(PagerLR1Parser.weakly_compatible({i: 0b011, j: 0b110}, {i: 0b10, j: 0b01}))
+
+
+if __name__ == '__main__':
+    unittest.main()
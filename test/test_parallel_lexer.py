@@ -0,0 +1,34 @@
+import random
+import unittest
+
+from util.Lexer import Lexer
+from util.ParallelLexer import ParallelLexer
+
+token_exprs = [
+    (r'[ \n\t]+', None),
+    (r'/\*[\s\S]*?\*/', None, True),
+    (r'"[^"]*"', 'STRING', True),
+    (r'#[^\n]*', None),
+    (r'[0-9]+', 'NUMBER'),
+    (r'[a-z]+', 'IDENTIFIER'),
+    (r'[-+*/()]', 'OPERATOR'),
+]
+
+parts = ['12', 'abc', ' ', '\n', '\n', '# comment\n', '/* a\n b\n */', '"s\n t"', '(', ')', '+', '*', '/', '-']
+
+
+class ParallelLexerTest(unittest.TestCase):
+    def test1(self):
+        rand = random.Random(7)
+        for _ in range(5):
+            text = ''.join(rand.choice(parts) for _ in range(rand.randint(0, 500)))
+            expected = Lexer(text, token_exprs).tokenize_bulk(eof='$')
+            # with and without the line spanning declarations, which only guide where chunks are cut
+            for spec in (token_exprs, [expr[:2] for expr in token_exprs]):
+                batch = ParallelLexer(spec, workers=4, min_chunk=1).tokenize(text, eof='$')
+                self.assertEqual((expected.types, expected.starts, expected.ends),
+                                 (batch.types, batch.starts, batch.ends))
+
+    def test2(self):
+        lexer = ParallelLexer(token_exprs, workers=3, min_chunk=1)
+        self.assertRaises(ValueError, lexer.tokenize, '1 2\n3 4\n5 ?\n6 7\n8 9\n')
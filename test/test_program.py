@@ -67,4 +67,8 @@ class ParserTest(unittest.TestCase):
                */
                42
            '''))
-        
\ No newline at end of file
+
+    def test11(self):
+        parser = Parser()
+        self.assertDictEqual({'type': 'Program', 'body': {'type': 'StringLiteral', 'value': 'hi'}},
+                             parser.parse('// comment\n' * 5000 + '"hi"'))
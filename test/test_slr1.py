@@ -61,4 +61,78 @@ class SLR1Test(unittest.TestCase):
             inputs.append(lexer.next())
         inputs.append(Token('$', '$'))
 
-        parser.parse(inputs)
\ No newline at end of file
+        parser.parse(inputs)
+
+    def test8(self):
+        parser = SLR1Parser('g7.bnf')
+        parser.canonical_collection()
+        parser.build_parse_table()
+        token_exprs = [
+            (r'[ \n\t]+', None),
+            (r'[0-9]+', 'NUMBER'),
+            (r'\(', '('),
+            (r'\)', ')'),
+            (r'\+', '+'),
+            (r'\-', '-'),
+            (r'\*', '*'),
+            (r'\/', '/'),
+        ]
+        parser.parse(Lexer("1 + 2 * (3 - 4)", token_exprs).tokenize_bulk(eof='$'))
+        self.assertEqual('+', parser.ast['op'])
+
+        lexer = Lexer("1 + 2 * (3 - 4)", token_exprs, span=True)
+        parser.parse(list(iter(lexer.next, None)) + [Token('$', '$')])
+        self.assertEqual('4', parser.ast['right']['right']['right'])
+
+    def test9(self):
+        parser = SLR1Parser('g7.bnf')
+        parser.canonical_collection()
+        parser.build_parse_table()
+        token_exprs = [
+            (r'[ \n\t]+', None),
+            (r'[-]?[0-9]+', 'NUMBER'),
+            (r'\(', '('),
+            (r'\)', ')'),
+            (r'\+', '+'),
+            (r'\-', '-'),
+            (r'\*', '*'),
+            (r'\/', '/'),
+        ]
+        # lexed up front, the '-' of 3-4 is taken as a sign
+        self.assertRaises(AssertionError, parser.parse, Lexer("-1 + 3-4", token_exprs).tokenize_bulk(eof='$'))
+        # scanned by the parser, NUMBER is only tried where an operand can start
+        parser.parse(Lexer("-1 + 3-4", token_exprs))
+        self.assertEqual('-1', parser.ast['left']['left'])
+        self.assertEqual('-', parser.ast['op'])
+        self.assertEqual('4', parser.ast['right'])
+        with self.assertRaisesRegex(AssertionError, 'unexpected \\) in state .* at 2:3'):
+            parser.parse(Lexer("1 +\n2 )", token_exprs))
+        with self.assertRaisesRegex(AssertionError, 'unexpected \\$ in state .* at 1:4'):
+            parser.parse(Lexer("1 +", token_exprs, span=True).tokenize_bulk(eof='$'))
+        self.assertRaises(ValueError, parser.parse, Lexer("1 + a", token_exprs))
+
+    def test10(self):
+        token_exprs = [
+            (r'[ \n\t]+', None),
+            (r'[0-9]+', 'NUMBER'),
+            (r'\(', '('),
+            (r'\)', ')'),
+            (r'\+', '+'),
+            (r'\-', '-'),
+            (r'\*', '*'),
+            (r'\/', '/'),
+        ]
+        text = '1 + 2 * 3 - 4 / 5 - 6'
+        results = []
+        for bypass in (False, True):
+            parser = SLR1Parser('g5.bnf')
+            parser.bypass_unit_rules = bypass
+            parser.canonical_collection()
+            parser.build_parse_table()
+            parser.parse(Lexer(text, token_exprs).tokenize_bulk(eof='$'))
+            results.append((parser.ast, parser.reduce_count))
+        self.assertEqual(results[0][0], results[1][0])
+        # the unit rules are E -> T (3) and T -> F (6): of the 16 reductions, the bypass skips E -> T on 1 and T -> F
+        # on 1, 2, 4 and 6; 3 and 5 are reduced straight into T -> T * F and T -> T / F, never by T -> F
+        self.assertEqual({3, 6}, parser.unit_rules)
+        self.assertEqual((16, 11), (results[0][1], results[1][1]))
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from LR.LALR1Parser import LALR1Parser
+from LR.SLR1Parser import SLR1Parser
+from util import Digraph
+from util.Lexer import Lexer
+from util.TableCache import TableCache, SUFFIX
+
+
+class TableCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def entries(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(SUFFIX))
+
+    def test1(self):
+        token_exprs = [
+            (r'[ \n\t]+', None),
+            (r'[0-9]+', 'NUMBER'),
+            (r'\(', '('),
+            (r'\)', ')'),
+            (r'\+', '+'),
+            (r'\-', '-'),
+            (r'\*', '*'),
+            (r'\/', '/'),
+        ]
+        text = '1 + 2 * (3 - 4) / 5 - 6'
+        for engine in (SLR1Parser, LALR1Parser):
+            results = []
+            for _ in range(2):
+                parser = engine('g5.bnf', cache_dir=self.directory)
+                tables = parser.build_tables()
+                parser.parse(Lexer(text, token_exprs).tokenize_bulk(eof='$'))
+                results.append((parser, tables, parser.ast))
+            (built, tables1, ast1), (loaded, tables2, ast2) = results
+            self.assertIsNotNone(built.lr0_states)
+            # the second parser took the tables from the cache instead of building the automaton
+            self.assertIsNone(loaded.lr0_states)
+            self.assertEqual(tables1, tables2)
+            self.assertEqual(built.first_set, loaded.first_set)
+            self.assertEqual(built.follow_set, loaded.follow_set)
+            self.assertEqual(ast1, ast2)
+        # one entry per engine
+        self.assertEqual(2, len(self.entries()))
+
+    def test2(self):
+        grammar = os.path.join(self.directory, 'g.bnf')
+        shutil.copy('g7.bnf', grammar)
+        SLR1Parser(grammar, cache_dir=self.directory).build_tables()
+        self.assertIsNotNone(SLR1Parser(grammar, cache_dir=self.directory).cached)
+        self.assertIsNone(SLR1Parser(grammar, eof='#', cache_dir=self.directory).cached)
+        # an edited grammar misses
+        with open(grammar, 'a') as f:
+            f.write('\n  | IDENTIFIER {result=p1}\n')
+        self.assertIsNone(SLR1Parser(grammar, cache_dir=self.directory).cached)
+
+    def test3(self):
+        # room for two entries
+        cache = TableCache(self.directory, max_bytes=300)
+        keys = [TableCache.key('grammar', str(i)) for i in range(3)]
+        for i, key in enumerate(keys[:2]):
+            cache.store(key, {'payload': 'x' * 100, 'index': i})
+            os.utime(cache.path(key), ns=((i + 1) * 10 ** 9,) * 2)
+        # a hit makes keys[0] the most recently used, so keys[1] goes
+        self.assertEqual(0, cache.load(keys[0])['index'])
+        cache.store(keys[2], {'payload': 'x' * 100, 'index': 2})
+        self.assertIsNone(cache.load(keys[1]))
+        self.assertEqual(0, cache.load(keys[0])['index'])
+        self.assertEqual(2, cache.load(keys[2])['index'])
+
+    def test4(self):
+        cache = TableCache(self.directory)
+        key = TableCache.key('grammar')
+        cache.store(key, [1, 2, 3])
+        self.assertEqual([1, 2, 3], cache.load(key))
+        with open(cache.path(key), 'r+b') as f:
+            f.truncate(10)
+        # a damaged entry is a miss and is removed
+        self.assertIsNone(cache.load(key))
+        self.assertEqual([], self.entries())
+        self.assertNotEqual(TableCache.key('ab', 'c'), TableCache.key('a', 'bc'))
+
+    def test5(self):
+        # the LALR(1) lookaheads are closed with util.Digraph, which defines no class
+        with open(Digraph.__file__, 'rb') as f:
+            digraph_source = f.read()
+        self.assertIn(digraph_source, TableCache.module_sources(LALR1Parser, Digraph.digraph).split(b'\0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
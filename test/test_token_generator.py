@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+
+from util.Lexer import Lexer
+from util.TokenGenerator import FileTokenGenerator, MmapTokenGenerator, TokenGenerator
+
+token_exprs = [
+    (r'[ \n\t]+', None),
+    (r'#[^\n]*', None),
+    (r'/\*[\s\S]*?\*/', None),
+    (r'[-]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?', 'NUMBER'),
+    (r'\(', '('),
+    (r'\)', ')'),
+    (r'\+', '+'),
+    (r'\-', '-'),
+    (r'\*', '*'),
+    (r'\/', '/'),
+    (r'[a-zA-Z_][a-zA-Z0-9_]*', 'IDENTIFIER'),
+]
+
+text = ('12345.678 + ' + 'long_identifier_' * 8 + ' # a line comment\n * (/* a block\n comment */ 3 - 4) / x ') * 20
+
+
+class TokenGeneratorTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.files = 0
+
+    def write(self, content):
+        self.files += 1
+        path = os.path.join(self.directory, f'tokens{self.files}.txt')
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def check(self, content, chunk_sizes):
+        lexer = Lexer(content, token_exprs)
+        expected = []
+        while lexer.has_next():
+            token = lexer.next()
+            expected.append((token.type, token.value))
+        path = self.write(content)
+        for chunk_size in chunk_sizes:
+            tokens = [(t.type, t.value) for t in FileTokenGenerator(path, token_exprs, chunk_size=chunk_size)]
+            self.assertEqual(expected, tokens)
+        self.assertEqual(expected, [(t.type, t.value) for t in MmapTokenGenerator(path, token_exprs)])
+
+    def test1(self):
+        # greedy tokens and line comments may be longer than a chunk
+        self.check(text, (24, 64, 1 << 16))
+
+    def test2(self):
+        path = self.write('1 + 2')
+        for generator in (TokenGenerator(path, token_exprs), FileTokenGenerator(path, token_exprs, chunk_size=2),
+                          MmapTokenGenerator(path, token_exprs)):
+            self.assertEqual(['NUMBER', '+', 'NUMBER', '$'], [generator.next_token().type for _ in range(4)])
+            self.assertRaises(AssertionError, generator.next_token)
+
+    def test3(self):
+        generator = FileTokenGenerator(self.write('1 + 2 ?'), token_exprs, chunk_size=2)
+        self.assertRaises(ValueError, list, generator)
+
+    def test4(self):
+        generator = MmapTokenGenerator(self.write(''), token_exprs)
+        self.assertEqual('$', generator.next_token().type)
+        self.assertRaises(ValueError, list, MmapTokenGenerator(self.write('1 + 2 ?'), token_exprs))
+
+    def test5(self):
+        path = self.write('1 + x')
+        with MmapTokenGenerator(path, token_exprs) as generator:
+            tokens = list(generator)
+            self.assertEqual('x', tokens[-1].value)
+        # the map is closed, tokens not read so far can no longer be
+        self.assertRaises(ValueError, lambda: tokens[0].value)
+        # non-ASCII classes and code point escapes have no bytes equivalent
+        for pattern in (r'[a-zé]+', r'[\u00e0-\u00ff]+', r'\N{EM DASH}'):
+            with self.assertRaises(ValueError):
+                MmapTokenGenerator(path, token_exprs + [(pattern, 'WORD')])
+        # an escaped backslash before a u is only a backslash
+        with MmapTokenGenerator(self.write('1 \\u'), token_exprs + [(r'\\u', 'U')]) as generator:
+            self.assertEqual(['NUMBER', 'U'], [t.type for t in generator])
+
+    def test6(self):
+        # a block comment longer than a chunk is not lexed as / and * once its start is read
+        content = '1 /* ' + 'x ' * 100 + '*/ 2'
+        self.check(content, (8, 64))
+        generator = FileTokenGenerator(self.write(content), token_exprs, chunk_size=64)
+        self.assertEqual([('NUMBER', '1'), ('NUMBER', '2')], [(t.type, t.value) for t in generator])
+        # nor is a string longer than a chunk, or a comment left open up to the end of file
+        strings = token_exprs + [(r'"[^"\n]*"', 'STRING'), (r'"', 'QUOTE')]
+        content = 'x "' + 'y ' * 100 + '" "' + 'z ' * 50 + '\n' + '1 /* ' + 'x ' * 100
+        lexer = Lexer(content, strings)
+        expected = [(t.type, t.value) for t in iter(lexer.advance, None)]
+        self.assertIn(('QUOTE', '"'), expected)
+        for chunk_size in (8, 64):
+            generator = FileTokenGenerator(self.write(content), strings, chunk_size=chunk_size)
+            self.assertEqual(expected, [(t.type, t.value) for t in generator])
+        # look-arounds can not be checked
+        self.assertRaises(ValueError, FileTokenGenerator, self.write(content), token_exprs + [(r'(?=a)b', 'B')])
+
+
+    def test7(self):
+        # a token that goes on in the next chunk is not cut where the chunk ends, even though its start matches
+        numbers = [(r'[ \n\t]+', None), (r'\d+(\.\d+)?', 'NUMBER'), (r'\.', '.'), (r'\+', '+')]
+        generator = FileTokenGenerator(self.write('1 + 12345.678'), numbers, chunk_size=5)
+        self.assertEqual([('NUMBER', '1'), ('+', '+'), ('NUMBER', '12345.678')], [(t.type, t.value) for t in generator])
+        self.check('ab 1.5e+10 + 12345.678 + .5', (1, 2, 3, 4, 5))
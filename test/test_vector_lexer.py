@@ -0,0 +1,70 @@
+import random
+import unittest
+
+from LR.SLR1Parser import SLR1Parser
+from util.Lexer import Lexer
+from util.VectorLexer import VectorLexer, np
+
+token_exprs = [
+    (r'[ \n\t]+', None),
+    (r'[0-9]+', 'NUMBER'),
+    (r'\(', '('),
+    (r'\)', ')'),
+    (r'\+', '+'),
+    (r'\-', '-'),
+    (r'\*', '*'),
+    (r'\/', '/'),
+]
+
+
+class VectorLexerTest(unittest.TestCase):
+    def check(self, lexer, text):
+        expected = Lexer(text, lexer.token_exprs).tokenize_bulk(eof='$')
+        batch = lexer.tokenize(text, eof='$')
+        self.assertEqual((expected.tags, expected.types, expected.starts, expected.ends),
+                         (batch.tags, batch.types, batch.starts, batch.ends))
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test1(self):
+        lexer = VectorLexer(token_exprs)
+        self.assertTrue(lexer.supported)
+        rand = random.Random(11)
+        for text in ['', '1', ' ', '1 + 2 * (3 - 4)', '12((34))\n/5']:
+            self.check(lexer, text)
+        for _ in range(20):
+            self.check(lexer, ''.join(rand.choice(['7', '42', ' ', '\n', '(', ')', '+', '-', '*', '/'])
+                                      for _ in range(rand.randint(1, 300))))
+        self.assertEqual(['NUMBER', '-', 'NUMBER'], [token.type for token in lexer.tokenize(b'3-4')])
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test2(self):
+        self.assertRaises(ValueError, VectorLexer(token_exprs).tokenize, '1 + x')
+
+    def test3(self):
+        # out of reach specs fall back to the regex lexer, among them a NUMBER with a sign, fraction or exponent
+        for spec in [[(r'\s+', None)] + token_exprs[1:], [(r'[0-9]*\.?[0-9]+', 'NUMBER')] + token_exprs,
+                     [(r'[-]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?', 'NUMBER')] + token_exprs]:
+            self.assertFalse(VectorLexer(spec).supported)
+        self.check(VectorLexer([(r'\+\+', 'INC')] + token_exprs + [(r'[a-z]+', 'IDENTIFIER')]), 'a++1 +b')
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test4(self):
+        # the g5 terminals with identifiers and comments, whose runs take the first character of other rules
+        g5_exprs = token_exprs[:1] + [(r'#[^\n]*', None)] + token_exprs[1:] + [(r'[a-zA-Z_]\w*', 'IDENTIFIER')]
+        lexer = VectorLexer(g5_exprs)
+        self.assertTrue(lexer.supported)
+        self.assertFalse(lexer.fixed.all())
+        rand = random.Random(5)
+        for text in ['', 'a1', '1a', 'x1 + 2y # 3 + z\n4', '#', '# a\n#b']:
+            self.check(lexer, text)
+        for _ in range(50):
+            self.check(lexer, ''.join(rand.choice(['x', '_', '7', '42', ' ', '\n', '#', '(', '+', 'a1', '\t'])
+                                      for _ in range(rand.randint(1, 300))))
+        # a line longer than MAX_STEPS tokens goes through Lexer
+        lexer.MAX_STEPS = 2
+        self.check(lexer, 'a1 + b2 ' * 20 + '# x y z')
+        parser = SLR1Parser('g5.bnf')
+        parser.canonical_collection()
+        parser.build_parse_table()
+        parser.parse(lexer.tokenize('1 + 2 * (3 - 4) # done\n', eof='$'))
+        self.assertEqual('BinaryExpression', parser.ast['type'])
@@ -1,5 +1,25 @@
-import copy
-import shlex
+import re
+from itertools import compress
+
+from util.Digraph import digraph
+from util.Grammar import Grammar
+
+
+# One symbol of a grammar line. A symbol that starts with a quote is read like shlex.split reads a word: double and
+# single quoted pieces and bare runs joined up to white space, the quotes removed, \" and \\ escaped in double
+# quotes. Any other symbol is a bare run of non-blank characters in which quotes and backslashes are plain
+# characters, so primed nonterminals like E' read as they are written. A quote left open at the start of a symbol is an error.
+QUOTED = r'"(?:[^"\\]|\\.)*"|\'[^\']*\''
+SYMBOL = re.compile(rf'((?:{QUOTED})(?:{QUOTED}|[^\s"\']+)*)|([^\s"\']\S*)|(\S)')
+PIECE = re.compile(r'"((?:[^"\\]|\\.)*)"|\'([^\']*)\'')
+ESCAPE = re.compile(r'\\(["\\])')
+
+
+def unquote(symbol: str) -> str:
+    """
+    A quoted symbol read by SYMBOL with its quotes and escapes removed.
+    """
+    return PIECE.sub(lambda m: m[2] if m[1] is None else ESCAPE.sub(r'\1', m[1]), symbol)
 
 
 class BNF:
@@ -9,7 +29,9 @@ class BNF:
 
 class BnfBuilder:
     def __init__(self, bnf_path: str, prod_delimiter: str = '->', or_delimiter: str = '|', epsilon: str = 'ε',
-                 comment_symbol: str = '//') -> None:
+                 comment_symbol: str = '//', analysis: str = 'worklist') -> None:
+        if analysis not in ('worklist', 'scc'):
+            raise ValueError(f"unknown analysis: {analysis}")
         self.bnf_path = bnf_path
         self.prod_delimiter = prod_delimiter
         self.or_delimiter = or_delimiter
@@ -24,36 +46,83 @@ class BnfBuilder:
         self.current_line = None
         self.first_set = None
         self.follow_set = None
+        # 'worklist' propagates FIRST/FOLLOW changes rule by rule, 'scc' solves the dependency graphs below in one
+        # pass over their strongly connected components
+        self.analysis = analysis
+        # the Grammar, its rules and FIRST/nullable bitsets over its symbol ids, kept by build_first_set for
+        # build_follow_set
+        self.interned = None
+        # dependency graphs over nonterminal ids (see Grammar), built in 'scc' mode: FIRST(x) includes FIRST(y) for
+        # y in first_graph[x], FOLLOW(x) includes FOLLOW(y) for y in follow_graph[x]
+        self.first_graph = None
+        self.follow_graph = None
+        self.compiled = None
         self.grammar_list = []
         self.semantic_action_cache = []
         self.semantic_action = []
         self.precedence = []
 
-    def build_first_set(self):
-        self.first_set = self.first(self.production_map, epsilon_symbol=self.epsilon)
+    def build_grammar(self, eof: str = '$') -> Grammar:
+        """
+        The compiled Grammar of the productions read by build(), made once and shared by the parser engines.
+        """
+        if self.compiled is None or self.compiled.eof != eof:
+            self.compiled = Grammar(self.grammar_list, self.start_symbol, self.epsilon, self.precedence, eof)
+        return self.compiled
+
+    def build_first_set(self, eof: str = '$'):
+        grammar = self.build_grammar(eof)
+        rules = grammar.rules()
+        if self.analysis == 'scc':
+            nullable = self.nullable_bits(rules, grammar.nt_count)
+            self.first_graph, initial = self.first_dependencies(rules, grammar.nt_count, nullable)
+            first = digraph(self.first_graph, initial)
+        else:
+            first, nullable = self.first_bits(rules, grammar.nt_count)
+        self.interned = grammar, rules, first, nullable
+        self.first_set = self.first_dict(grammar.symbols[:grammar.nt_count], grammar.symbols, first, nullable,
+                                         self.epsilon)
 
-    def build_follow_set(self):
-        self.follow_set = self.follow(self.production_map, self.first_set, self.non_terminals, self.start_symbol,
-                                      self.epsilon)
+    def build_follow_set(self, eof: str = '$'):
+        if self.interned is None or self.interned[0] is not self.build_grammar(eof):
+            self.build_first_set(eof)
+        grammar, rules, first, nullable = self.interned
+        nt_count = grammar.nt_count
+        start = grammar.symbol_ids.get(self.start_symbol, -1)
+        if self.analysis == 'scc':
+            self.follow_graph, initial = self.follow_dependencies(rules, nt_count, first, nullable, start,
+                                                                  grammar.eof_id)
+            follow = digraph(self.follow_graph, initial)
+        else:
+            follow = self.follow_bits(rules, nt_count, first, nullable, start, grammar.eof_id)
+        terminals = grammar.symbols[nt_count:]
+        self.follow_set = {g: self.bits_to_set(follow[i] >> nt_count, terminals)
+                           for i, g in enumerate(grammar.symbols[:nt_count])}
 
     def build(self):
-        file = open(self.bnf_path, "r")
-        line = file.readline()
-        while line:
+        """
+        Read the grammar file: `A -> x y` productions with `|` alternatives, or the `<A> ::= x y` format of LR/bnf.py
+        with prod_delimiter='::='. Lines that are not productions, alternatives, `//` comments or `%left`/`%right`
+        declarations make up the semantic action of the production before them.
+        """
+        with open(self.bnf_path, "r") as file:
+            text = file.read()
+        findall = SYMBOL.findall
+        for line in text.splitlines(keepends=True):
             self.current_line = line
-            self.build_production(shlex.split(line))
-            line = file.readline()
-        file.close()
+            p = []
+            for quoted, bare, unclosed in findall(line):
+                if unclosed:
+                    raise AssertionError(f'No closing quotation in "{line.rstrip()}"')
+                p.append(bare or unquote(quoted))
+            self.build_production(p)
         if self.semantic_action_cache:
             self.semantic_action[-1] = ''.join(self.semantic_action_cache)
             self.semantic_action_cache = []
         self.terminals = self.symbols - self.non_terminals
 
     def _find_index(self, p: list, item) -> int:
-        for index, s in enumerate(p):
-            if s == item:
-                return index
-        return -1
+        return p.index(item) if item in p else -1
 
     def build_production(self, p):
         if not p:
@@ -108,9 +177,195 @@ class BnfBuilder:
                     self.semantic_action[(len(self.grammar_list)) - 2] = ''.join(self.semantic_action_cache)
                     self.semantic_action_cache = []
 
-        for s in p:
-            if s != self.epsilon and s != self.or_delimiter and s != self.prod_delimiter:
-                self.symbols.add(s)
+        self.symbols.update(p)
+        self.symbols.difference_update((self.epsilon, self.or_delimiter, self.prod_delimiter))
+
+    @staticmethod
+    def intern(grammar: dict, epsilon_symbol: str = 'ε', extra=()) -> tuple[list, dict, list]:
+        """
+        Number the symbols of a dict grammar like Grammar does: nonterminals first (0 to len(grammar) - 1), then
+        terminals and the extra symbols in order of appearance. Returns the symbol list, the symbol ids and the rules as (lhs id, rhs ids)
+        without the epsilon symbol, so that FIRST, FOLLOW and nullable can be int bitsets over symbol ids.
+        """
+        symbols = list(grammar)
+        ids = {s: i for i, s in enumerate(symbols)}
+        rules = []
+        for g in grammar:
+            for rule in grammar[g]:
+                rhs = []
+                for s in rule:
+                    if s == epsilon_symbol:
+                        continue
+                    if s not in ids:
+                        ids[s] = len(symbols)
+                        symbols.append(s)
+                    rhs.append(ids[s])
+                rules.append((ids[g], rhs))
+        for s in extra:
+            if s not in ids:
+                ids[s] = len(symbols)
+                symbols.append(s)
+        return symbols, ids, rules
+
+    @staticmethod
+    def bits_to_set(bits: int, symbols: list) -> set:
+        """
+        The symbols whose bits are set, bit i standing for symbols[i].
+        """
+        return set(compress(symbols, map('1'.__eq__, bin(bits)[:1:-1])))
+
+    @staticmethod
+    def first_bits(rules: list, nt_count: int) -> tuple[list[int], int]:
+        """
+        FIRST of every nonterminal as a bitset of terminal ids, and the bitset of nullable nonterminals.
+        Rules are taken from a worklist: one is evaluated again only when a nonterminal of its rhs grew.
+        """
+        first = [0] * nt_count
+        nullable = 0
+        users = [[] for _ in range(nt_count)]
+        for index, (_, rhs) in enumerate(rules):
+            for s in set(rhs):
+                if s < nt_count:
+                    users[s].append(index)
+        work = list(range(len(rules)))
+        queued = [True] * len(rules)
+        while work:
+            index = work.pop()
+            queued[index] = False
+            lhs, rhs = rules[index]
+            bits = 0
+            grew = False
+            for s in rhs:
+                if s >= nt_count:
+                    bits |= 1 << s
+                    break
+                bits |= first[s]
+                if not nullable >> s & 1:
+                    break
+            else:
+                if not nullable >> lhs & 1:
+                    nullable |= 1 << lhs
+                    grew = True
+            if bits & ~first[lhs]:
+                first[lhs] |= bits
+                grew = True
+            if grew:
+                for user in users[lhs]:
+                    if not queued[user]:
+                        queued[user] = True
+                        work.append(user)
+        return first, nullable
+
+    @staticmethod
+    def follow_bits(rules: list, nt_count: int, first: list[int], nullable: int, start: int, eof: int) -> list[int]:
+        """
+        FOLLOW of every nonterminal as a bitset. One right to left pass over each rule A -> xBy adds FIRST(y) to
+        FOLLOW(B) and, when y is nullable, an edge A -> B; FOLLOW(A) then flows along the edges from a worklist.
+        """
+        follow = [0] * nt_count
+        if start >= 0:
+            follow[start] = 1 << eof
+        edges = [set() for _ in range(nt_count)]
+        for lhs, rhs in rules:
+            trail = 0
+            trail_nullable = True
+            for s in reversed(rhs):
+                if s >= nt_count:
+                    trail = 1 << s
+                    trail_nullable = False
+                    continue
+                follow[s] |= trail
+                if trail_nullable and s != lhs:
+                    edges[lhs].add(s)
+                if nullable >> s & 1:
+                    trail |= first[s]
+                else:
+                    trail = first[s]
+                    trail_nullable = False
+        work = list(range(nt_count))
+        while work:
+            a = work.pop()
+            for b in edges[a]:
+                if follow[a] & ~follow[b]:
+                    follow[b] |= follow[a]
+                    work.append(b)
+        return follow
+
+    @staticmethod
+    def nullable_bits(rules: list, nt_count: int) -> int:
+        """
+        The bitset of nullable nonterminals, in time linear in the grammar size: every rule counts the rhs symbols
+        not known to be nullable yet, and its lhs becomes nullable when the count drops to 0.
+        """
+        pending = []
+        users = [[] for _ in range(nt_count)]
+        work = []
+        for index, (lhs, rhs) in enumerate(rules):
+            if any(s >= nt_count for s in rhs):
+                pending.append(-1)
+                continue
+            pending.append(len(rhs))
+            for s in rhs:
+                users[s].append(index)
+            if not rhs:
+                work.append(lhs)
+        nullable = 0
+        while work:
+            x = work.pop()
+            if nullable >> x & 1:
+                continue
+            nullable |= 1 << x
+            for index in users[x]:
+                pending[index] -= 1
+                if pending[index] == 0:
+                    work.append(rules[index][0])
+        return nullable
+
+    @staticmethod
+    def first_dependencies(rules: list, nt_count: int, nullable: int) -> tuple[list[set], list[int]]:
+        """
+        For X -> aYb with a nullable: the edge X -> Y, or the bit of Y in the initial FIRST(X) when Y is a terminal.
+        """
+        edges = [set() for _ in range(nt_count)]
+        initial = [0] * nt_count
+        for lhs, rhs in rules:
+            for s in rhs:
+                if s >= nt_count:
+                    initial[lhs] |= 1 << s
+                    break
+                if s != lhs:
+                    edges[lhs].add(s)
+                if not nullable >> s & 1:
+                    break
+        return edges, initial
+
+    @staticmethod
+    def follow_dependencies(rules: list, nt_count: int, first: list[int], nullable: int, start: int,
+                            eof: int) -> tuple[list[set], list[int]]:
+        """
+        For A -> xBy: FIRST(y) in the initial FOLLOW(B), and the edge B -> A when y is nullable.
+        """
+        edges = [set() for _ in range(nt_count)]
+        initial = [0] * nt_count
+        if start >= 0:
+            initial[start] = 1 << eof
+        for lhs, rhs in rules:
+            trail = 0
+            trail_nullable = True
+            for s in reversed(rhs):
+                if s >= nt_count:
+                    trail = 1 << s
+                    trail_nullable = False
+                    continue
+                initial[s] |= trail
+                if trail_nullable and s != lhs:
+                    edges[s].add(lhs)
+                if nullable >> s & 1:
+                    trail |= first[s]
+                else:
+                    trail = first[s]
+                    trail_nullable = False
+        return edges, initial
 
     @staticmethod
     def first(grammar: dict, epsilon_symbol: str = 'ε'):
@@ -119,30 +374,23 @@ class BnfBuilder:
             #1. First(a) = a, a is terminal.
             #2. X -> Y1Y2...Yn, for each symbol Yi, if 'ε' is not in First(Yi), First(X) = First(X) U First(Yi).
                 If 'ε' is in First(Yi), First(X) = First(X) U First(Yi) U First(Yi+1).
-            #3. if X -> ε, add 'ε' to First(X).
+            #3. if X -> ε, or every Yi has 'ε' in First(Yi), add 'ε' to First(X).
         :param grammar:
         :return:
         """
+        symbols, _, rules = BnfBuilder.intern(grammar, epsilon_symbol)
+        first, nullable = BnfBuilder.first_bits(rules, len(grammar))
+        return BnfBuilder.first_dict(grammar, symbols, first, nullable, epsilon_symbol)
+
+    @staticmethod
+    def first_dict(grammar: dict, symbols: list, first: list[int], nullable: int, epsilon_symbol: str = 'ε') -> dict:
+        # FIRST sets only hold terminals, numbered after the nonterminals
+        terminals = symbols[len(grammar):]
         result = {}
-        last_result_count = {}
-        is_change = True
-        for g in grammar:
-            result[g] = set()
-            last_result_count[g] = 0
-        while is_change:
-            for g in grammar:
-                rhs = grammar[g]
-                for rules in rhs:
-                    for r in rules:
-                        f = copy.deepcopy(result.get(r, {r}))
-                        result[g] |= f
-                        if epsilon_symbol not in f:
-                            break
-            is_change = False
-            for r in result:
-                if len(result[r]) != last_result_count[r]:
-                    last_result_count[r] = len(result[r])
-                    is_change = True
+        for i, g in enumerate(grammar):
+            result[g] = BnfBuilder.bits_to_set(first[i] >> len(grammar), terminals)
+            if nullable >> i & 1:
+                result[g].add(epsilon_symbol)
         return result
 
     @staticmethod
@@ -152,37 +400,22 @@ class BnfBuilder:
         Rules:
             #1. If S is start symbol,add eof to Follow(S).
             #2. A -> xBy, add {First(y) - ε} to Follow(B).
-            #3. A -> xB, add Follow(A) to Follow(B).
+            #3. A -> xB, or A -> xBy with 'ε' in First(y), add Follow(A) to Follow(B).
         :param grammar:
         :param first_set:
         :return:
         """
-        result = {}
-        last_result_count = {}
-        is_change = True
-        for g in grammar:
-            result[g] = set()
-            last_result_count[g] = 0
-            if g == start_symbol:
-                result[g].add(eof)
-                last_result_count[g] += 1
-
-        while is_change:
-            for g in grammar:
-                rhs = grammar[g]
-                for rule in rhs:
-                    l = len(rule)
-                    for i, s in enumerate(rule):
-                        if s not in non_terminals:
-                            continue
-                        if i == l - 1:
-                            result[s] |= copy.deepcopy(result[g])
-                        else:
-                            result[s] |= copy.deepcopy(first_set.get(rule[i + 1], {rule[i + 1]}) - set(epsilon_symbol))
-
-            is_change = False
-            for r in result:
-                if len(result[r]) != last_result_count[r]:
-                    last_result_count[r] = len(result[r])
-                    is_change = True
-        return result
+        extra = [s for g in grammar for s in first_set.get(g, ()) if s != epsilon_symbol] + [eof]
+        symbols, ids, rules = BnfBuilder.intern(grammar, epsilon_symbol, extra)
+        first = [0] * len(grammar)
+        nullable = 0
+        for i, g in enumerate(grammar):
+            for s in first_set.get(g, ()):
+                if s == epsilon_symbol:
+                    nullable |= 1 << i
+                else:
+                    first[i] |= 1 << ids[s]
+        start = ids[start_symbol] if start_symbol in grammar else -1
+        follow = BnfBuilder.follow_bits(rules, len(grammar), first, nullable, start, ids[eof])
+        terminals = symbols[len(grammar):]
+        return {g: BnfBuilder.bits_to_set(follow[i] >> len(grammar), terminals) for i, g in enumerate(grammar)}
@@ -0,0 +1,524 @@
+# Table driven lexer generator.
+# Turns a token_exprs spec into one minimized DFA and scans with it, one character per step.
+import json
+import re
+from bisect import bisect_right
+
+from util.Lexer import Token
+
+MAX_CHAR = 0x10FFFF
+
+DIGIT = [(48, 57)]
+WORD = [(48, 57), (65, 90), (95, 95), (97, 122)]
+SPACE = [(9, 13), (32, 32)]
+
+CLASS_ESCAPES = {'d': DIGIT, 'w': WORD, 's': SPACE}
+BOUNDS = re.compile(r'\{(\d*)(,?)(\d*)\}')
+CHAR_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'f': '\f', 'v': '\v', '0': '\0', 'a': '\a'}
+
+
+def normalize(intervals):
+    result = []
+    for lo, hi in sorted(intervals):
+        if result and lo <= result[-1][1] + 1:
+            if hi > result[-1][1]:
+                result[-1] = (result[-1][0], hi)
+        else:
+            result.append((lo, hi))
+    return result
+
+
+def complement(intervals):
+    result = []
+    start = 0
+    for lo, hi in normalize(intervals):
+        if lo > start:
+            result.append((start, lo - 1))
+        start = hi + 1
+    if start <= MAX_CHAR:
+        result.append((start, MAX_CHAR))
+    return result
+
+
+class RegexParser:
+    """
+    Parses the regex subset used in token_exprs into a small tree:
+        ('set', intervals), ('cat', nodes), ('alt', nodes), ('repeat', node, min, max)
+    Supported: literals, escapes, '.', [...] classes, groups, '|', '*', '+', '?', '{m,n}' and lazy quantifiers.
+    Anchors, look-arounds and back references have no DFA equivalent and are rejected.
+    Like lex, '\\d', '\\w' and '\\s' use their ASCII definitions.
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.pos = 0
+        self.lazy = False
+
+    def parse(self):
+        node = self.parse_alt()
+        if self.pos < len(self.pattern):
+            self.error('unbalanced parenthesis')
+        return node
+
+    def error(self, message):
+        raise ValueError(f"{message} at position {self.pos} in pattern {self.pattern!r}")
+
+    def peek(self):
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def next_char(self):
+        if self.pos >= len(self.pattern):
+            self.error('unexpected end of pattern')
+        c = self.pattern[self.pos]
+        self.pos += 1
+        return c
+
+    def parse_alt(self):
+        branches = [self.parse_cat()]
+        while self.peek() == '|':
+            self.pos += 1
+            branches.append(self.parse_cat())
+        return branches[0] if len(branches) == 1 else ('alt', branches)
+
+    def parse_cat(self):
+        items = []
+        while self.peek() is not None and self.peek() not in '|)':
+            items.append(self.parse_repeat())
+        return items[0] if len(items) == 1 else ('cat', items)
+
+    def parse_repeat(self):
+        node = self.parse_atom()
+        while True:
+            c = self.peek()
+            if c == '*':
+                bounds = (0, None)
+            elif c == '+':
+                bounds = (1, None)
+            elif c == '?':
+                bounds = (0, 1)
+            elif c == '{' and self.parse_bounds() is not None:
+                bounds = self.parse_bounds()
+            else:
+                return node
+            if c == '{':
+                self.pos = BOUNDS.match(self.pattern, self.pos).end()
+            else:
+                self.pos += 1
+            if self.peek() == '?':
+                self.pos += 1
+                self.lazy = True
+            elif self.peek() == '+':
+                self.error('possessive quantifiers are not supported')
+            node = ('repeat', node, bounds[0], bounds[1])
+
+    def parse_bounds(self):
+        m = BOUNDS.match(self.pattern, self.pos)
+        if m is None or not (m.group(1) or m.group(3)):
+            return None
+        low = int(m.group(1)) if m.group(1) else 0
+        if not m.group(2):
+            return low, low
+        return low, int(m.group(3)) if m.group(3) else None
+
+    def parse_atom(self):
+        c = self.next_char()
+        if c == '(':
+            if self.peek() == '?':
+                self.pos += 1
+                if self.peek() == ':':
+                    self.pos += 1
+                elif self.pattern.startswith('P<', self.pos):
+                    self.pos = self.pattern.index('>', self.pos) + 1
+                else:
+                    self.error('unsupported group extension')
+            node = self.parse_alt()
+            if self.next_char() != ')':
+                self.error('missing )')
+            return node
+        if c == '[':
+            return 'set', self.parse_class()
+        if c == '.':
+            return 'set', complement([(10, 10)])
+        if c == '\\':
+            return 'set', self.parse_escape()
+        if c in '^$':
+            self.error('anchors are not supported')
+        if c in '*+?':
+            self.error('nothing to repeat')
+        return 'set', [(ord(c), ord(c))]
+
+    def parse_escape(self, in_class=False):
+        c = self.next_char()
+        if c in CLASS_ESCAPES:
+            return CLASS_ESCAPES[c]
+        if c.lower() in CLASS_ESCAPES:
+            return complement(CLASS_ESCAPES[c.lower()])
+        if c in CHAR_ESCAPES:
+            return [(ord(CHAR_ESCAPES[c]), ord(CHAR_ESCAPES[c]))]
+        if c == 'b' and in_class:
+            return [(8, 8)]
+        if c in 'xuU':
+            size = {'x': 2, 'u': 4, 'U': 8}[c]
+            digits = self.pattern[self.pos:self.pos + size]
+            if len(digits) != size:
+                self.error('incomplete escape')
+            self.pos += size
+            code = int(digits, 16)
+            return [(code, code)]
+        if c.isalnum():
+            self.error(f'unsupported escape \\{c}')
+        return [(ord(c), ord(c))]
+
+    def parse_class(self):
+        negate = self.peek() == '^'
+        if negate:
+            self.pos += 1
+        intervals = []
+        first = True
+        while True:
+            c = self.next_char()
+            if c == ']' and not first:
+                break
+            first = False
+            if c == '\\':
+                items = self.parse_escape(in_class=True)
+            else:
+                items = [(ord(c), ord(c))]
+            if len(items) == 1 and items[0][0] == items[0][1] and self.peek() == '-' and \
+                    self.pattern[self.pos + 1:self.pos + 2] not in (']', ''):
+                self.pos += 1
+                c = self.next_char()
+                high = self.parse_escape(in_class=True) if c == '\\' else [(ord(c), ord(c))]
+                if len(high) != 1 or high[0][0] != high[0][1] or high[0][0] < items[0][0]:
+                    self.error('bad character range')
+                items = [(items[0][0], high[0][0])]
+            intervals.extend(items)
+        intervals = normalize(intervals)
+        return complement(intervals) if negate else intervals
+
+
+class DfaTable:
+    """
+    A minimized DFA in flat table form.
+
+    Characters are mapped to classes by `boundaries` (class i covers code points boundaries[i] up to, not including,
+    boundaries[i + 1]); next state is table[state * class_count + class], -1 when there is no transition.
+    accept[state] is the index of the rule the state accepts, -1 for none. State 0 is the start state.
+    """
+
+    VERSION = 1
+
+    def __init__(self, tags: list, boundaries: list[int], table: list[int], accept: list[int]):
+        self.tags = tags
+        self.boundaries = boundaries
+        self.class_count = len(boundaries) - 1
+        self.table = table
+        self.accept = accept
+        self.ascii_classes = [self.char_class(c) for c in range(128)]
+
+    def char_class(self, code: int) -> int:
+        return bisect_right(self.boundaries, code) - 1
+
+    @property
+    def state_count(self):
+        return len(self.accept)
+
+    def first_live_rules(self) -> list[int]:
+        """
+        Per state, the first rule that some continuation of the input can still make it accept, the number of rules
+        when there is none.
+        """
+        rule_count = len(self.tags)
+        live = [rule if rule >= 0 else rule_count for rule in self.accept]
+        class_count = self.class_count
+        changed = True
+        while changed:
+            changed = False
+            for state in range(self.state_count):
+                row = self.table[state * class_count:(state + 1) * class_count]
+                best = min((live[target] for target in row if target >= 0), default=rule_count)
+                if best < live[state]:
+                    live[state] = best
+                    changed = True
+        return live
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.VERSION,
+            "tags": self.tags,
+            "boundaries": self.boundaries,
+            "table": self.table,
+            "accept": self.accept,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"unsupported dfa table version: {data.get('version')}")
+        return cls(data["tags"], data["boundaries"], data["table"], data["accept"])
+
+    def dump(self, path: str):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, 'r') as file:
+            return cls.from_dict(json.load(file))
+
+
+class DfaBuilder:
+    """
+    Builds a DfaTable from token_exprs with lex semantics: the longest match wins, and between matches of the same
+    length the rule listed first wins. A rule containing a lazy quantifier matches its shortest accepted prefix,
+    e.g. r'/\\*[\\s\\S]*?\\*/' stops at the first '*/'.
+    """
+
+    def __init__(self, token_exprs):
+        self.token_exprs = [(expr[0], expr[1]) for expr in token_exprs]
+        self.trees = []
+        self.lazy = []
+        for pattern, _ in self.token_exprs:
+            parser = RegexParser(pattern)
+            self.trees.append(parser.parse())
+            self.lazy.append(parser.lazy)
+        self.boundaries = self.build_boundaries()
+        # nfa: per state a list of (classes, target); classes None is an epsilon move
+        self.edges = []
+
+    def build_boundaries(self) -> list[int]:
+        points = {0, MAX_CHAR + 1}
+        stack = list(self.trees)
+        while stack:
+            node = stack.pop()
+            if node[0] == 'set':
+                for lo, hi in node[1]:
+                    points.add(lo)
+                    points.add(hi + 1)
+            elif node[0] == 'repeat':
+                stack.append(node[1])
+            else:
+                stack.extend(node[1])
+        return sorted(points)
+
+    def classes_of(self, intervals) -> frozenset:
+        classes = set()
+        for lo, hi in intervals:
+            classes.update(range(bisect_right(self.boundaries, lo) - 1, bisect_right(self.boundaries, hi)))
+        return frozenset(classes)
+
+    def new_state(self) -> int:
+        self.edges.append([])
+        return len(self.edges) - 1
+
+    def build_nfa(self, node) -> tuple[int, int]:
+        kind = node[0]
+        if kind == 'set':
+            start, end = self.new_state(), self.new_state()
+            self.edges[start].append((self.classes_of(node[1]), end))
+            return start, end
+        if kind == 'cat':
+            start = end = self.new_state()
+            for child in node[1]:
+                s, e = self.build_nfa(child)
+                self.edges[end].append((None, s))
+                end = e
+            return start, end
+        if kind == 'alt':
+            start, end = self.new_state(), self.new_state()
+            for child in node[1]:
+                s, e = self.build_nfa(child)
+                self.edges[start].append((None, s))
+                self.edges[e].append((None, end))
+            return start, end
+        # repeat: `low` mandatory copies followed by optional copies or a loop
+        _, child, low, high = node
+        start = end = self.new_state()
+        for _ in range(low):
+            s, e = self.build_nfa(child)
+            self.edges[end].append((None, s))
+            end = e
+        if high is None:
+            s, e = self.build_nfa(child)
+            self.edges[end].append((None, s))
+            self.edges[e].append((None, s))
+            self.edges[s].append((None, e))
+            end = e
+        else:
+            for _ in range(high - low):
+                s, e = self.build_nfa(child)
+                self.edges[end].append((None, s))
+                self.edges[s].append((None, e))
+                end = e
+        return start, end
+
+    def epsilon_closure(self, states) -> frozenset:
+        result = set(states)
+        stack = list(states)
+        while stack:
+            for classes, target in self.edges[stack.pop()]:
+                if classes is None and target not in result:
+                    result.add(target)
+                    stack.append(target)
+        return frozenset(result)
+
+    def determinize(self, starts, accepts: dict) -> tuple[list[dict], list[int]]:
+        """
+        Subset construction. accepts maps nfa accept states to rule indices; a dfa state accepts the smallest one.
+        """
+        start = self.epsilon_closure(starts)
+        index = {start: 0}
+        subsets = [start]
+        rows = []
+        accept = []
+        for subset in subsets:
+            moves = {}
+            for state in subset:
+                for classes, target in self.edges[state]:
+                    if classes is not None:
+                        for c in classes:
+                            moves.setdefault(c, set()).add(target)
+            row = {}
+            for c, targets in moves.items():
+                closure = self.epsilon_closure(targets)
+                if closure not in index:
+                    index[closure] = len(subsets)
+                    subsets.append(closure)
+                row[c] = index[closure]
+            rows.append(row)
+            accept.append(min((accepts[s] for s in subset if s in accepts), default=-1))
+        return rows, accept
+
+    def embed(self, rows: list[dict], accept: list[int], rule: int, accepts: dict) -> int:
+        """
+        Copy a dfa back into the nfa and return its start state.
+        """
+        base = len(self.edges)
+        for _ in rows:
+            self.new_state()
+        for state, row in enumerate(rows):
+            targets = {}
+            for c, target in row.items():
+                targets.setdefault(target, set()).add(c)
+            for target, classes in targets.items():
+                self.edges[base + state].append((frozenset(classes), base + target))
+            if accept[state] >= 0:
+                accepts[base + state] = rule
+        return base
+
+    def build(self) -> DfaTable:
+        starts = []
+        accepts = {}
+        for rule, tree in enumerate(self.trees):
+            start, end = self.build_nfa(tree)
+            if self.lazy[rule]:
+                # shortest match: stop at the first accepting state of this rule
+                rows, accept = self.determinize([start], {end: rule})
+                for state, row in enumerate(rows):
+                    if accept[state] >= 0:
+                        row.clear()
+                start = self.embed(rows, accept, rule, accepts)
+            else:
+                accepts[end] = rule
+            starts.append(start)
+        rows, accept = self.determinize(starts, accepts)
+        rows, accept = self.minimize(rows, accept)
+        class_count = len(self.boundaries) - 1
+        table = [-1] * (len(rows) * class_count)
+        for state, row in enumerate(rows):
+            for c, target in row.items():
+                table[state * class_count + c] = target
+        return DfaTable([tag for _, tag in self.token_exprs], self.boundaries, table, accept)
+
+    @staticmethod
+    def minimize(rows: list[dict], accept: list[int]) -> tuple[list[dict], list[int]]:
+        """
+        Drop states that can not reach an accepting state, then merge equivalent states by partition refinement.
+        """
+        live = {s for s, a in enumerate(accept) if a >= 0}
+        changed = True
+        while changed:
+            changed = False
+            for state, row in enumerate(rows):
+                if state not in live and any(t in live for t in row.values()):
+                    live.add(state)
+                    changed = True
+        rows = [{c: t for c, t in row.items() if t in live} for row in rows]
+
+        block = list(accept)
+        count = len(set(block))
+        while True:
+            signatures = {}
+            new_block = []
+            for state, row in enumerate(rows):
+                signature = (block[state], tuple(sorted((c, block[t]) for c, t in row.items())))
+                new_block.append(signatures.setdefault(signature, len(signatures)))
+            block = new_block
+            if len(signatures) == count:
+                break
+            count = len(signatures)
+
+        # renumber blocks in breadth first order so that the start state is 0
+        number = {block[0]: 0}
+        order = [0]
+        for state in order:
+            for c, target in sorted(rows[state].items()):
+                if block[target] not in number:
+                    number[block[target]] = len(number)
+                    order.append(target)
+        new_rows = []
+        new_accept = []
+        for state in order:
+            new_rows.append({c: number[block[t]] for c, t in rows[state].items()})
+            new_accept.append(accept[state])
+        return new_rows, new_accept
+
+
+def build_dfa(token_exprs) -> DfaTable:
+    return DfaBuilder(token_exprs).build()
+
+
+class DfaLexer:
+    """
+    Scans with a DfaTable. Each step reads one character and follows one table entry; after the longest match the
+    scanner resumes right after it.
+    """
+
+    def __init__(self, table: DfaTable):
+        self.dfa = table
+
+    def tokens(self, text: str):
+        dfa = self.dfa
+        table = dfa.table
+        accept = dfa.accept
+        tags = dfa.tags
+        class_count = dfa.class_count
+        ascii_classes = dfa.ascii_classes
+        char_class = dfa.char_class
+        end = len(text)
+        pos = 0
+        while pos < end:
+            state = 0
+            i = pos
+            rule = -1
+            match_end = pos
+            while i < end:
+                code = ord(text[i])
+                state = table[state * class_count + (ascii_classes[code] if code < 128 else char_class(code))]
+                if state < 0:
+                    break
+                i += 1
+                if accept[state] >= 0:
+                    rule = accept[state]
+                    match_end = i
+            if rule < 0:
+                raise ValueError('Illegal character: %s' % text[pos])
+            if tags[rule]:
+                yield Token(tags[rule], text[pos:match_end])
+            pos = match_end
+
+    def tokenize(self, text: str, eof: str = None) -> list[Token]:
+        tokens = list(self.tokens(text))
+        if eof is not None:
+            tokens.append(Token(eof, eof))
+        return tokens
@@ -0,0 +1,75 @@
+# Graph algorithms for grammar and automaton analyses.
+# Graphs are adjacency lists over the vertices 0..n-1: edges[x] lists the successors of x.
+
+
+def strongly_connected(edges) -> list[list[int]]:
+    """
+    Tarjan's algorithm, iterative so that deep grammars do not hit the recursion limit. Components come out in
+    reverse topological order: every edge leaving a component goes to one listed before it.
+    """
+    n = len(edges)
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack = []
+    components = []
+    counter = 0
+    for root in range(n):
+        if index[root] >= 0:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        calls = [(root, iter(edges[root]))]
+        while calls:
+            x, successors = calls[-1]
+            for y in successors:
+                if index[y] < 0:
+                    index[y] = low[y] = counter
+                    counter += 1
+                    stack.append(y)
+                    on_stack[y] = True
+                    calls.append((y, iter(edges[y])))
+                    break
+                if on_stack[y] and index[y] < low[x]:
+                    low[x] = index[y]
+            else:
+                calls.pop()
+                if calls and low[x] < low[calls[-1][0]]:
+                    low[calls[-1][0]] = low[x]
+                if low[x] == index[x]:
+                    component = []
+                    while True:
+                        z = stack.pop()
+                        on_stack[z] = False
+                        component.append(z)
+                        if z == x:
+                            break
+                    components.append(component)
+    return components
+
+
+def digraph(edges, initial: list, components: list[list[int]] = None) -> list:
+    """
+    DeRemer and Pennello's digraph method: the smallest F with F(x) = initial[x] | F(y) for every edge x -> y.
+    The members of a strongly connected component share one value, and components are solved sinks first, so
+    every value is computed once whatever the shape of the graph. Values are combined with |, e.g. int bitsets.
+    """
+    if components is None:
+        components = strongly_connected(edges)
+    result = list(initial)
+    component_of = [0] * len(edges)
+    for c, members in enumerate(components):
+        for x in members:
+            component_of[x] = c
+    for c, members in enumerate(components):
+        value = initial[members[0]]
+        for x in members:
+            value = value | initial[x]
+            for y in edges[x]:
+                if component_of[y] != c:
+                    value = value | result[y]
+        for x in members:
+            result[x] = value
+    return result
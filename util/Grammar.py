@@ -0,0 +1,113 @@
+from array import array
+
+
+class Grammar:
+    """
+    A grammar compiled to integers, shared by the parser engines.
+
+    Symbols are numbered with the nonterminals first (0 to nt_count - 1), then the terminals, then eof, so that
+    `symbol < nt_count` tells a nonterminal; BnfBuilder computes FIRST/FOLLOW as bitsets over these ids. Production
+    p has lhs prod_lhs[p] and rhs rhs_symbols[rhs_offsets[p]:rhs_offsets[p + 1]], with the epsilon symbol left out.
+    nt_productions[A] holds the production ids of A, a range when they are listed together in the grammar.
+    """
+
+    def __init__(self, productions: list[tuple], start_symbol: str, epsilon: str = 'ε', precedence: list = None,
+                 eof: str = '$'):
+        # (lhs, rhs) string pairs as written, rhs being (epsilon,) for an empty production
+        self.productions = [(lhs, tuple(rhs)) for lhs, rhs in productions]
+        self.start_symbol = start_symbol
+        self.epsilon = epsilon
+        self.eof = eof
+        self.precedence_levels = precedence or []
+
+        self.symbols = []
+        self.symbol_ids = {}
+        for lhs, _ in self.productions:
+            self._intern(lhs)
+        self.nt_count = len(self.symbols)
+        for _, rhs in self.productions:
+            for s in rhs:
+                if s != epsilon:
+                    self._intern(s)
+        self.eof_id = self._intern(eof)
+
+        self.prod_lhs = array('I')
+        self.rhs_offsets = array('I', [0])
+        self.rhs_symbols = array('I')
+        self.production_index = {}
+        ids = self.symbol_ids
+        for p, (lhs, rhs) in enumerate(self.productions):
+            self.prod_lhs.append(ids[lhs])
+            self.rhs_symbols.extend(ids[s] for s in rhs if s != epsilon)
+            self.rhs_offsets.append(len(self.rhs_symbols))
+            self.production_index.setdefault((lhs, rhs), p)
+
+        grouped = [[] for _ in range(self.nt_count)]
+        for p, lhs in enumerate(self.prod_lhs):
+            grouped[lhs].append(p)
+        self.nt_productions = [range(ps[0], ps[-1] + 1) if ps[-1] - ps[0] == len(ps) - 1 else tuple(ps)
+                               for ps in grouped]
+
+        # terminal -> (level, associativity), higher levels bind tighter
+        self.precedence = {}
+        for level, ps in enumerate(self.precedence_levels):
+            for association, terminal in ps:
+                self.precedence.setdefault(terminal, (level, association))
+        # precedence of every production, the one of its rightmost terminal: (-1, None) without a terminal,
+        # (None, None) when that terminal has no precedence
+        self.production_precedence = []
+        for p in range(len(self.productions)):
+            terminals = [s for s in self.rhs(p) if s >= self.nt_count]
+            if not terminals:
+                self.production_precedence.append((-1, None))
+            else:
+                self.production_precedence.append(self.precedence.get(self.symbols[terminals[-1]], (None, None)))
+
+    def _intern(self, symbol: str) -> int:
+        index = self.symbol_ids.get(symbol)
+        if index is None:
+            index = self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return index
+
+    def __len__(self):
+        return len(self.productions)
+
+    def rhs(self, p: int) -> array:
+        return self.rhs_symbols[self.rhs_offsets[p]:self.rhs_offsets[p + 1]]
+
+    def rhs_len(self, p: int) -> int:
+        return self.rhs_offsets[p + 1] - self.rhs_offsets[p]
+
+    def is_terminal(self, symbol: int) -> bool:
+        return symbol >= self.nt_count
+
+    def is_non_terminal(self, symbol: int) -> bool:
+        return symbol < self.nt_count
+
+    def rules(self) -> list[tuple[int, array]]:
+        """
+        The productions as (lhs id, rhs ids), the input of BnfBuilder.first_bits and follow_bits.
+        """
+        return [(self.prod_lhs[p], self.rhs(p)) for p in range(len(self.productions))]
+
+    def left_corners(self) -> list[list[int]]:
+        """
+        The starts-with relation as adjacency lists: edges[A] holds every nonterminal B with a production A -> B ...
+        """
+        edges = [[] for _ in range(self.nt_count)]
+        for p, lhs in enumerate(self.prod_lhs):
+            offset = self.rhs_offsets[p]
+            if offset < self.rhs_offsets[p + 1] and self.rhs_symbols[offset] < self.nt_count:
+                first = self.rhs_symbols[offset]
+                if first not in edges[lhs]:
+                    edges[lhs].append(first)
+        return edges
+
+    def augment(self, start_symbol: str = None) -> 'Grammar':
+        """
+        The grammar with production 0 set to S' -> S, S' being start_symbol (S + "'" by default).
+        """
+        start_symbol = start_symbol or self.start_symbol + "'"
+        return Grammar([(start_symbol, (self.start_symbol,))] + self.productions, start_symbol, self.epsilon,
+                       self.precedence_levels, self.eof)
@@ -1,4 +1,9 @@
+import mmap
 import re
+from array import array
+from bisect import bisect_left
+
+from util.LineIndex import LineIndex, offset_typecode
 
 # Define the regular expressions for each token type
 TOKEN_REGEX = [
@@ -14,6 +19,8 @@ TOKEN_REGEX = [
 
 # Define the Token class to hold each token's type and value
 class Token:
+    __slots__ = ('type', 'value')
+
     def __init__(self, token_type, value):
         self.type = token_type
         self.value = value
@@ -30,52 +37,677 @@ class Token:
             raise ValueError(f"index:{index} not support")
 
 
+class SpanToken(Token):
+    """
+    A token that only keeps (start, end) into a shared buffer: a str, bytes, memoryview or mmap.
+    The value is sliced out (and decoded for binary buffers) on first access and cached.
+    """
+    __slots__ = ('buffer', 'start', 'end', '_value')
+
+    encoding = 'utf-8'
+
+    def __init__(self, token_type, buffer, start: int, end: int):
+        self.type = token_type
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+        self._value = None
+
+    @property
+    def value(self):
+        if self._value is None:
+            value = self.buffer[self.start:self.end]
+            if not isinstance(value, str):
+                value = bytes(value).decode(self.encoding)
+            self._value = value
+        return self._value
+
+    def __repr__(self):
+        return f'SpanToken({self.type}, {self.start}:{self.end})'
+
+
+class FallThrough:
+    """
+    The match of a later pattern standing in for an empty match, which makes no token (see
+    TokenSpec.match_nonempty). lastindex is the group of that pattern in the regex that matched empty.
+    """
+    __slots__ = ('match', 'lastindex')
+
+    def __init__(self, match, lastindex: int):
+        self.match = match
+        self.lastindex = lastindex
+
+    def start(self):
+        return self.match.start()
+
+    def end(self):
+        return self.match.end()
+
+    def group(self, *groups):
+        return self.match.group(*groups)
+
+
+# Compiled token specs, keyed by the (pattern, tag) tuples they were built from.
+_spec_cache = {}
+
+# the group name of pattern i in the regexes of a TokenSpec
+TOKEN_GROUP = re.compile(r'T\d+')
+
+# \u, \U and \N{...} escapes, the backslash not itself escaped
+UNICODE_ESCAPE = re.compile(r'(?<!\\)(?:\\\\)*\\[uUN]')
+
+
+class SpanningAttempts:
+    """
+    Finds where an attempt of a line spanning pattern may look past its line without matching, like a block comment
+    left open: a later line then decides whether it matches, so relex has to restart before it. The DFA of the line
+    spanning patterns (see DfaLexer) runs from a token start while a pattern listed before the one that won there is
+    alive. A match that a line spanning pattern wins needs no such care: like any other it is decided by the text up
+    to the end of the line it ends on.
+    """
+
+    def __init__(self, spec: 'TokenSpec', dfa):
+        rules = [index for index, spans in enumerate(spec.spans_lines) if spans]
+        self.rule_count = len(spec.token_exprs)
+        self.dfa = dfa
+        # per state, the first rule (index in token_exprs) some continuation can still match
+        self.live = [rules[rule] if rule < len(rules) else self.rule_count for rule in dfa.first_live_rules()]
+        # the characters a line spanning pattern can start with, as a class for str and bytes input
+        ranges = []
+        for index in range(dfa.class_count):
+            if dfa.table[index] >= 0:
+                ranges.append((dfa.boundaries[index], dfa.boundaries[index + 1] - 1))
+        pattern = ''.join(f'\\U{lo:08x}-\\U{hi:08x}' for lo, hi in ranges)
+        byte_pattern = b''.join(b'\\x%02x-\\x%02x' % (lo, min(hi, 255)) for lo, hi in ranges if lo < 256)
+        self.search = re.compile(f'[{pattern}]' if pattern else '(?!)').search
+        self.search_bytes = re.compile(b'[' + byte_pattern + b']' if byte_pattern else b'(?!)').search
+
+    def next_start(self, text, pos: int) -> int:
+        """
+        The first position from pos on where a line spanning pattern may start, len(text) when there is none.
+        """
+        m = (self.search if isinstance(text, str) else self.search_bytes)(text, pos)
+        return m.start() if m else len(text)
+
+    def reach(self, text, pos: int, rule: int) -> int:
+        """
+        Where the attempt at pos stops looking, rule having won there: the position the DFA gets stuck at or has only
+        rules from rule on left, len(text) when it is still alive at the end. -1 when it does not get past the line of
+        pos, so that no later line can change it.
+        """
+        dfa = self.dfa
+        table = dfa.table
+        class_count = dfa.class_count
+        ascii_classes = dfa.ascii_classes
+        live = self.live
+        binary = not isinstance(text, str)
+        end = len(text)
+        state = 0
+        crossed = False
+        while pos < end:
+            code = text[pos] if binary else ord(text[pos])
+            state = table[state * class_count + (ascii_classes[code] if code < 128 else dfa.char_class(code))]
+            if state < 0 or live[state] >= rule:
+                break
+            if code == 10:
+                crossed = True
+            pos += 1
+        return pos if crossed else -1
+
+    def record(self, text, pos: int, m, rule: int, attempts: array, reaches: array, start: int) -> int:
+        """
+        Record the attempt at pos, where rule won with match m, when it looks past its line. start is the last position
+        next_start gave, pos or before it. Returns the next position to call it at.
+        """
+        if start < pos:
+            start = self.next_start(text, pos)
+            if start > pos:
+                return start
+        code = text[pos] if not isinstance(text, str) else ord(text[pos])
+        state = self.dfa.table[self.dfa.ascii_classes[code] if code < 128 else self.dfa.char_class(code)]
+        if self.live[state] < rule:
+            reach = self.reach(text, pos, rule)
+            if reach >= 0:
+                attempts.append(pos)
+                reaches.append(max(reach, reaches[-1]) if reaches else reach)
+        return self.next_start(text, m.end())
+
+
+class TokenSpec:
+    """
+    A token_exprs list compiled into a single master regex.
+
+    Every pattern becomes a named group of one alternation, so the first pattern that matches wins exactly as if
+    the patterns were tried one by one, but a token costs only one match() call.
+    """
+
+    def __init__(self, token_exprs):
+        self.token_exprs = [(expr[0], expr[1]) for expr in token_exprs]
+        # an optional third item (pattern, tag, True) declares that the pattern can match across lines
+        self.spans_lines = [len(expr) > 2 and bool(expr[2]) for expr in token_exprs]
+        self.regex = re.compile('|'.join(f'(?P<T{index}>{pattern})' for index, (pattern, _) in
+                                         enumerate(self.token_exprs)))
+        # tag of each pattern, indexed by the group number reported in match.lastindex
+        self.group_tags = [None] * (self.regex.groups + 1)
+        for index, (_, tag) in enumerate(self.token_exprs):
+            self.group_tags[self.regex.groupindex[f'T{index}']] = tag
+        # distinct tags numbered in order of appearance, the ids stored by tokenize_bulk
+        self.tags = []
+        self.tag_ids = {}
+        for _, tag in self.token_exprs:
+            if tag and tag not in self.tag_ids:
+                self.tag_ids[tag] = len(self.tags)
+                self.tags.append(tag)
+        self.group_ids = [-1 if tag is None else self.tag_ids[tag] for tag in self.group_tags]
+        # index in token_exprs of the pattern of each group number reported in match.lastindex
+        self.group_rules = [None] * (self.regex.groups + 1)
+        for index in range(len(self.token_exprs)):
+            self.group_rules[self.regex.groupindex[f'T{index}']] = index
+        self._attempts = False
+        self._bytes_regex = None
+        self._restricted = {}
+        self._spanning = {}
+        self._later = {}
+
+    @property
+    def bytes_regex(self):
+        """
+        The master regex compiled for bytes input (bytes, memoryview, mmap), from the same patterns as ASCII bytes.
+        Character classes and escapes like \\d then match ASCII bytes only. A pattern with a non-ASCII character or
+        a code point escape has no bytes equivalent (a class would take the UTF-8 bytes of a character one by one),
+        so it raises ValueError rather than lexing differently.
+        """
+        if self._bytes_regex is None:
+            for pattern, tag in self.token_exprs:
+                if not pattern.isascii() or UNICODE_ESCAPE.search(pattern):
+                    raise ValueError(f'Pattern {pattern!r} of token {tag} is not ASCII and can not lex bytes input, '
+                                     f'lex the decoded text instead')
+            self._bytes_regex = re.compile(self.regex.pattern.encode('ascii'))
+        return self._bytes_regex
+
+    def spanning_skip(self, binary: bool = False):
+        """
+        A regex that matches tokens from a position on for as long as the winning pattern is not line spanning, and
+        stops at a token a line spanning pattern wins (there it only matches the empty lookahead of that pattern, which
+        ends the repetition) or at illegal input. None without line spanning patterns.
+        """
+        if binary not in self._spanning:
+            found = None
+            if any(self.spans_lines):
+                pattern = '(?:%s)*' % '|'.join(f'(?={pattern})' if spans else f'(?:{pattern})'
+                                                for (pattern, _), spans in zip(self.token_exprs, self.spans_lines))
+                if binary:
+                    self.bytes_regex
+                found = re.compile(pattern.encode('ascii') if binary else pattern)
+            self._spanning[binary] = found
+        return self._spanning[binary]
+
+    @property
+    def attempts(self):
+        """
+        The SpanningAttempts of the spec, None without line spanning patterns or when one of them uses syntax the DFA
+        does not support (relex then looks for the attempts from the start of the input, see spanning_skip).
+        """
+        if self._attempts is False:
+            self._attempts = None
+            if any(self.spans_lines):
+                from util.DfaLexer import build_dfa
+                try:
+                    dfa = build_dfa([expr for expr, spans in zip(self.token_exprs, self.spans_lines) if spans])
+                except ValueError:
+                    pass
+                else:
+                    self._attempts = SpanningAttempts(self, dfa)
+        return self._attempts
+
+    def match_nonempty(self, regex, text, pos: int, m):
+        """
+        m, a match of regex (the master regex or one from restricted), is empty at pos. An empty match makes no token,
+        so the alternation falls through as trying the patterns one by one would: the first pattern of regex listed
+        after the one of m that matches at least one character wins, as a FallThrough. None when no pattern does.
+        """
+        key = (regex, m.lastindex)
+        later = self._later.get(key)
+        if later is None:
+            binary = isinstance(regex.pattern, bytes)
+            later = []
+            for name, group in sorted(regex.groupindex.items(), key=lambda item: item[1]):
+                if group > m.lastindex and TOKEN_GROUP.fullmatch(name):
+                    pattern = self.token_exprs[int(name[1:])][0]
+                    later.append((group, re.compile(pattern.encode('ascii') if binary else pattern)))
+            self._later[key] = later
+        for group, pattern in later:
+            found = pattern.match(text, pos)
+            if found is not None and found.end() > pos:
+                return FallThrough(found, group)
+        return None
+
+    def restricted(self, tags, binary: bool = False) -> tuple:
+        """
+        A master regex over the patterns of tags and the untagged ones only, in spec order, with its group tags.
+        Built once per tag set and cached.
+        """
+        key = (frozenset(tags), binary)
+        found = self._restricted.get(key)
+        if found is None:
+            if binary:
+                # the same checks as for the whole spec
+                self.bytes_regex
+            exprs = [(index, pattern, tag) for index, (pattern, tag) in enumerate(self.token_exprs)
+                     if tag is None or tag in key[0]]
+            # (?!) never matches, for a tag set with no pattern at all
+            pattern = '|'.join(f'(?P<T{index}>{pattern})' for index, pattern, _ in exprs) or '(?!)'
+            regex = re.compile(pattern.encode('ascii') if binary else pattern)
+            group_tags = [None] * (regex.groups + 1)
+            for index, _, tag in exprs:
+                group_tags[regex.groupindex[f'T{index}']] = tag
+            found = regex, group_tags
+            self._restricted[key] = found
+        return found
+
+
+def get_spec(token_exprs) -> TokenSpec:
+    key = tuple(tuple(expr) for expr in token_exprs)
+    spec = _spec_cache.get(key)
+    if spec is None:
+        spec = TokenSpec(key)
+        _spec_cache[key] = spec
+    return spec
+
+
+class TokenBatch:
+    """
+    The tokens of one input as parallel arrays: type ids in array('H') (indexes into tags), start and end offsets in
+    arrays of offset_typecode ('I', or 'Q' past 4 GiB as in LineIndex). Token text stays in the source and is only
+    sliced out when asked for.
+    Indexing gives SpanToken objects, so a batch can be handed to LR0Parser.parse in place of a list[Token].
+    A batch from Lexer also holds the starts of the line spanning attempts that look past their line (see
+    SpanningAttempts) in `attempts`, with `reaches[i]` the furthest any of attempts[:i + 1] looks; both are None
+    when they were not recorded.
+    """
+
+    def __init__(self, source, tags: list, types: array, starts: array, ends: array, eof: str = None,
+                 attempts: array = None, reaches: array = None):
+        self.source = source
+        self.tags = tags
+        self.types = types
+        self.starts = starts
+        self.ends = ends
+        self.eof = eof
+        self.attempts = attempts
+        self.reaches = reaches
+        self._line_index = None
+
+    @property
+    def line_index(self) -> LineIndex:
+        if self._line_index is None:
+            self._line_index = LineIndex(self.source)
+        return self._line_index
+
+    def line_col(self, index: int) -> tuple[int, int]:
+        return self.line_index.line_col(self.starts[index])
+
+    def __len__(self):
+        return len(self.types)
+
+    def type(self, index: int) -> str:
+        return self.tags[self.types[index]]
+
+    def value(self, index: int):
+        return self[index].value
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        tag = self.tags[self.types[index]]
+        if self.eof is not None and tag == self.eof:
+            return Token(tag, self.eof)
+        return SpanToken(tag, self.source, self.starts[index], self.ends[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
 # Define the Lexer class to tokenize the input text
 class Lexer:
-    def __init__(self, input, token_exprs):
+    """
+    Regex lexer over token_exprs.
+
+    Lookahead goes through a fixed ring buffer of `lookahead` tokens: peek(k) lexes each token once, advance()
+    consumes it, and mark()/reset() rewind to an earlier point. next(), putback() and has_next() are kept on top of it.
+    """
+
+    def __init__(self, input, token_exprs, span=False, lookahead=8):
         self.input = input
         self.pos = 0
         self.token_exprs = token_exprs
-        self.cached_tokens = []
+        self.spec = get_spec(token_exprs)
+        # binary input is lexed with bytes patterns and always gives SpanTokens, decoded only when their value is used
+        if isinstance(input, str):
+            self.regex = self.spec.regex
+            # produce SpanTokens that point into input instead of holding a copy of their text
+            self.span = span
+        else:
+            self.regex = self.spec.bytes_regex
+            self.span = True
+        self.lookahead = lookahead
+        self._ring = [None] * lookahead
+        # ring index of the next token, and number of tokens lexed but not consumed yet
+        self._head = 0
+        self._count = 0
         self.current_token = None
+        self._line_index = None
+        # the memory map opened by from_file, see close
+        self._mapping = None
+
+    @property
+    def line_index(self) -> LineIndex:
+        """
+        Newline offsets of the input, built on first use: tokens carry offsets only, and errors or AST nodes that
+        want a location resolve them here.
+        """
+        if self._line_index is None:
+            self._line_index = LineIndex(self.input)
+        return self._line_index
+
+    @classmethod
+    def from_file(cls, file_path, token_exprs):
+        """
+        Lex a file through a read only memory map: nothing is read or decoded up front. The tokens point into the
+        map, so it stays open until close(), or the end of a with block on the lexer.
+        """
+        with open(file_path, 'rb') as file:
+            try:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files can not be mapped
+                buffer = b''
+        if not isinstance(buffer, mmap.mmap):
+            return cls(buffer, token_exprs)
+        try:
+            lexer = cls(buffer, token_exprs)
+        except ValueError:
+            buffer.close()
+            raise
+        lexer._mapping = buffer
+        return lexer
+
+    def close(self):
+        """
+        Unmap the file of a lexer made by from_file. Values of SpanTokens not read yet can no longer be read.
+        """
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _illegal_character(self, pos):
+        return self._illegal_character_in(self.input, pos)
 
-    def _get_next_token(self):
-        if self.pos >= len(self.input):
+    @staticmethod
+    def _illegal_character_in(text, pos):
+        char = text[pos:pos + 1]
+        if not isinstance(char, str):
+            char = bytes(char).decode(SpanToken.encoding, errors='replace')
+        return ValueError('Illegal character: %s' % char)
+
+    def _get_next_token(self, regex=None, group_tags=None):
+        text = self.input
+        end = len(text)
+        pos = self.pos
+        match = (regex or self.regex).match
+        group_tags = group_tags or self.spec.group_tags
+        # skip untagged tokens (white space, comments) until a real token or the end of input
+        while pos < end:
+            m = match(text, pos)
+            if m is not None and m.end() == pos:
+                m = self.spec.match_nonempty(regex or self.regex, text, pos, m)
+            if m is None:
+                self.pos = pos
+                if regex is not None:
+                    # none of the expected tokens is here: lex with the whole spec so the caller sees what is
+                    return self._get_next_token()
+                raise self._illegal_character(pos)
+            tag = group_tags[m.lastindex]
+            start, pos = pos, m.end()
+            if tag:
+                self.pos = pos
+                return SpanToken(tag, text, start, pos) if self.span else Token(tag, m.group())
+        self.pos = pos
+        return None
+
+    def tokenize_bulk(self, eof: str = None) -> TokenBatch:
+        """
+        Lex the rest of the input into a TokenBatch. When eof is given, an eof token is appended at the end.
+        """
+        if self._count:
+            raise ValueError('tokenize_bulk called with tokens left in the lookahead buffer')
+        text = self.input
+        end = len(text)
+        pos = self.pos
+        match = self.regex.match
+        group_ids = self.spec.group_ids
+        group_rules = self.spec.group_rules
+        typecode = offset_typecode(end)
+        types = array('H')
+        starts = array(typecode)
+        ends = array(typecode)
+        add_type, add_start, add_end = types.append, starts.append, ends.append
+        spanning = self.spec.attempts
+        attempts = reaches = None
+        next_attempt = end
+        if spanning is not None:
+            attempts, reaches = array(typecode), array(typecode)
+            next_attempt = spanning.next_start(text, pos)
+        while pos < end:
+            m = match(text, pos)
+            if m is not None and m.end() == pos:
+                m = self.spec.match_nonempty(self.regex, text, pos, m)
+            if m is None:
+                self.pos = pos
+                raise self._illegal_character(pos)
+            tag_id = group_ids[m.lastindex]
+            token_end = m.end()
+            if tag_id >= 0:
+                add_type(tag_id)
+                add_start(pos)
+                add_end(token_end)
+            if pos >= next_attempt:
+                next_attempt = spanning.record(text, pos, m, group_rules[m.lastindex], attempts, reaches, next_attempt)
+            pos = token_end
+        self.pos = pos
+        tags = self.spec.tags
+        if eof is not None:
+            tags = tags + [eof]
+            add_type(len(tags) - 1)
+            add_start(end)
+            add_end(end)
+        return TokenBatch(text, tags, types, starts, ends, eof, attempts, reaches)
+
+
+    def relex(self, batch: TokenBatch, start: int, old_len: int, new_text) -> TokenBatch:
+        """
+        Update a batch of this lexer's input after replacing input[start:start + old_len] with new_text.
+
+        A match may depend on any text its patterns look at, not only on the text it covers, so lexing restarts after
+        the last token that ends before the line of the edit, or before an earlier line spanning attempt that looks
+        at it (see restart_offset). No earlier match can have looked at the edited text as long as every pattern that
+        matches across lines is declared line spanning. It stops as soon as a new token ends where an old token ended
+        after the edit: the lexer is then in the same state over the same text, so the old tail is reused with its
+        offsets shifted. The result is the batch a full lex of the edited input gives. The lexer moves on to the edited
+        input.
+        """
+        source = batch.source
+        text = source[:start] + new_text + source[start + old_len:]
+        delta = len(new_text) - old_len
+        edit_end = start + len(new_text)
+        count = len(batch) - (1 if batch.eof is not None else 0)
+        old_ends = batch.ends
+        keep = bisect_left(old_ends, self.restart_offset(batch, text, start), 0, count)
+        pos = old_ends[keep - 1] if keep else 0
+
+        types, starts, ends = batch.types[:keep], batch.starts[:keep], batch.ends[:keep]
+        end = len(text)
+        typecode = offset_typecode(end)
+        if starts.typecode != typecode:
+            # the edit took the input across 4 GiB
+            starts, ends = array(typecode, starts), array(typecode, ends)
+        match = self.regex.match
+        group_ids = self.spec.group_ids
+        group_rules = self.spec.group_rules
+        spanning = self.spec.attempts if batch.attempts is not None else None
+        attempts = reaches = None
+        next_attempt = end
+        if spanning is not None:
+            kept = bisect_left(batch.attempts, pos)
+            attempts, reaches = batch.attempts[:kept], batch.reaches[:kept]
+            if attempts.typecode != typecode:
+                attempts, reaches = array(typecode, attempts), array(typecode, reaches)
+            next_attempt = spanning.next_start(text, pos)
+        tail = count
+        while pos < end:
+            m = match(text, pos)
+            if m is not None and m.end() == pos:
+                m = self.spec.match_nonempty(self.regex, text, pos, m)
+            if m is None:
+                raise self._illegal_character_in(text, pos)
+            tag_id = group_ids[m.lastindex]
+            token_end = m.end()
+            if pos >= next_attempt:
+                next_attempt = spanning.record(text, pos, m, group_rules[m.lastindex], attempts, reaches, next_attempt)
+            pos = token_end
+            if tag_id >= 0:
+                types.append(tag_id)
+                starts.append(m.start())
+                ends.append(token_end)
+                if token_end >= edit_end:
+                    j = bisect_left(old_ends, token_end - delta, 0, count)
+                    if j < count and old_ends[j] == token_end - delta:
+                        tail = j + 1
+                        break
+        types.extend(batch.types[tail:count])
+        starts.extend(map(delta.__add__, batch.starts[tail:count]))
+        ends.extend(map(delta.__add__, batch.ends[tail:count]))
+        if batch.eof is not None:
+            types.append(batch.types[count])
+            starts.append(end)
+            ends.append(end)
+        if spanning is not None and tail < count:
+            # the attempts of the old tail, their reaches raised to those of the attempts before them
+            first = bisect_left(batch.attempts, pos - delta)
+            attempts.extend(map(delta.__add__, batch.attempts[first:]))
+            furthest = reaches[-1] - delta if reaches else 0
+            raised = bisect_left(batch.reaches, furthest, first)
+            reaches.extend([furthest + delta] * (raised - first))
+            reaches.extend(map(delta.__add__, batch.reaches[raised:]))
+        self.input = text
+        self.pos = end
+        self._line_index = None
+        return TokenBatch(text, batch.tags, types, starts, ends, batch.eof, attempts, reaches)
+
+    def restart_offset(self, batch: TokenBatch, text, start: int) -> int:
+        """
+        Where relex of the input of batch, edited at start into text, restarts: the tokens of batch that end before the
+        offset are those of text. Patterns not declared line spanning look at most up to the end of the line they start
+        on, so it is the start of the line of the edit, relexing the tokens and skips that run over it. Only a line
+        spanning attempt from an earlier token start can look further, like a comment that the edit closes; the
+        offset moves back to the first one recorded in batch that looks at the line. Without such records, the tokens
+        from the start of text are skipped by the regex engine (see TokenSpec.spanning_skip) up to a line spanning
+        match that reaches the line.
+        """
+        source = batch.source
+        newline = '\n' if isinstance(text, str) else b'\n'
+        line = source.rfind(newline, 0, start) + 1
+        if not line or not any(self.spec.spans_lines):
+            return line
+        if batch.attempts is not None:
+            index = bisect_left(batch.reaches, line)
+            if index < len(batch.attempts) and batch.attempts[index] < line:
+                return batch.attempts[index]
+            return line
+        skip = self.spec.spanning_skip(not isinstance(text, str))
+        match = self.regex.match
+        pos = 0
+        while True:
+            pos = skip.match(text, pos).end()
+            if pos >= line:
+                return line
+            m = match(text, pos)
+            if m is not None and m.end() == pos:
+                m = self.spec.match_nonempty(self.regex, text, pos, m)
+            if m is None:
+                # an error the old input had too, relex reports it
+                return line
+            if m.end() >= line:
+                return pos
+            pos = m.end()
+
+    def peek(self, k: int = 1):
+        """
+        The k-th token ahead (1 is the next one) without consuming it, None past the end of input.
+        """
+        if not 1 <= k <= self.lookahead:
+            raise ValueError(f'peek({k}) out of lookahead range 1..{self.lookahead}')
+        ring = self._ring
+        while self._count < k:
+            token = self._get_next_token()
+            if token is None:
+                return None
+            ring[(self._head + self._count) % self.lookahead] = token
+            self._count += 1
+        return ring[(self._head + k - 1) % self.lookahead]
+
+    def advance(self):
+        """
+        Consume and return the next token, None at the end of input.
+        """
+        if self._count == 0 and self.peek() is None:
             return None
-        for token_expr in self.token_exprs:
-            pattern, tag = token_expr
-            regex = re.compile(pattern)
-            match = regex.match(self.input, self.pos)
-            if match:
-                text = match.group(0)
-                if tag:
-                    token = Token(tag, text)
-                    self.pos = match.end(0)
-                    return token
-                else:
-                    self.pos = match.end(0)
-                    continue
-        else:
-            raise ValueError('Illegal character: %s' % self.input[self.pos])
+        token = self._ring[self._head]
+        self._ring[self._head] = None
+        self._head = (self._head + 1) % self.lookahead
+        self._count -= 1
+        return token
+
+    def mark(self):
+        """
+        Remember the current point. Tokens consumed after it are lexed again when reset() returns to it.
+        """
+        buffered = tuple(self._ring[(self._head + i) % self.lookahead] for i in range(self._count))
+        return self.pos, buffered
+
+    def reset(self, marker):
+        self.pos, buffered = marker
+        self._ring = list(buffered) + [None] * (self.lookahead - len(buffered))
+        self._head = 0
+        self._count = len(buffered)
 
     def next(self):
-        if self.cached_tokens:
-            return self.cached_tokens.pop()
-        token = self._get_next_token()
-        return token
+        return self.advance()
 
     def putback(self, token):
-        self.cached_tokens.append(token)
+        if self._count == self.lookahead:
+            raise ValueError('lookahead buffer is full')
+        self._head = (self._head - 1) % self.lookahead
+        self._ring[self._head] = token
+        self._count += 1
 
     def has_next(self):
-        if self.cached_tokens:
-            return True
-        try:
-            token = self._get_next_token()
-            if token:
-                self.putback(token)
-                return True
-            else:
-                return False
-        except ValueError:
-            return False
+        return self.peek() is not None
+
+    def scan(self, tags):
+        """
+        Lex the next token trying only the patterns of tags (and the untagged ones), for a parser that knows which
+        terminals it can take next. Tags listed earlier in the spec no longer shadow them, e.g. a keyword pattern
+        when only IDENTIFIER is expected. When none of them matches, the token is lexed with the whole spec.
+        None at the end of input.
+        """
+        if self._count:
+            raise ValueError('scan called with tokens left in the lookahead buffer')
+        return self._get_next_token(*self.spec.restricted(tags, not isinstance(self.input, str)))
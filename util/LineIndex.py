@@ -0,0 +1,36 @@
+import re
+from array import array
+from bisect import bisect_right
+
+
+def offset_typecode(size: int) -> str:
+    """
+    The array typecode for offsets into a source of size characters or bytes: 4 bytes each, 8 past 4 GiB.
+    """
+    return 'I' if size < LineIndex.SMALL_LIMIT else 'Q'
+
+
+class LineIndex:
+    """
+    Start offsets of the lines of one source (str, bytes, memoryview or mmap) in an array, so that lexers only
+    carry offsets and a (line, column) is worked out when something asks for it. Lines and columns count from 1;
+    columns of binary sources are in bytes.
+    """
+    # offsets past 4 GiB need the 8 byte typecode
+    SMALL_LIMIT = 1 << 32
+
+    def __init__(self, source):
+        self.source = source
+        self.starts = array(offset_typecode(len(source)), [0])
+        # the newlines are found in place: no line strings are made
+        self.starts.extend(m.end() for m in re.finditer('\n' if isinstance(source, str) else b'\n', source))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line_col(self, offset: int) -> tuple[int, int]:
+        line = bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+    def location(self, offset: int) -> str:
+        return '%d:%d' % self.line_col(offset)
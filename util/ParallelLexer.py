@@ -0,0 +1,156 @@
+# Parallel tokenization of large inputs.
+# The input is cut at line starts, every chunk is lexed in a worker process and the results are stitched into one
+# TokenBatch that is identical to Lexer.tokenize_bulk on the whole input.
+import multiprocessing
+import os
+import re
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+
+from util.Lexer import Lexer, TokenBatch, get_spec
+from util.LineIndex import offset_typecode
+
+# input and spec of a worker process, set once by init_worker
+_worker_text = None
+_worker_spec = None
+
+
+def init_worker(text, token_exprs):
+    global _worker_text, _worker_spec
+    _worker_text = text
+    _worker_spec = get_spec(token_exprs)
+
+
+def lex_range(start: int, stop: int) -> tuple:
+    """
+    Lex from start until the cursor reaches stop; the token crossing stop is finished with the text after it.
+    Returns the token arrays, the final cursor and whether lexing stopped on an error. start may be inside a token:
+    the stitching step only trusts these tokens once they line up with the lexer run of the previous chunk.
+    """
+    text, spec = _worker_text, _worker_spec
+    regex = spec.regex if isinstance(text, str) else spec.bytes_regex
+    match = regex.match
+    group_ids = spec.group_ids
+    typecode = offset_typecode(len(text))
+    types, starts, ends = array('H'), array(typecode), array(typecode)
+    pos = start
+    while pos < stop:
+        m = match(text, pos)
+        if m is not None and m.end() == pos:
+            m = spec.match_nonempty(regex, text, pos, m)
+        if m is None:
+            return types, starts, ends, pos, False
+        tag_id = group_ids[m.lastindex]
+        if tag_id >= 0:
+            types.append(tag_id)
+            starts.append(pos)
+            ends.append(m.end())
+        pos = m.end()
+    return types, starts, ends, pos, True
+
+
+def find_boundary(text, target: int, spanning, window: int = 1 << 16) -> int:
+    """
+    First line start at or after target. With line spanning patterns declared in the spec, a line start that falls
+    inside one of their matches, looking back up to `window` characters, is moved past that match.
+    """
+    newline = '\n' if isinstance(text, str) else b'\n'
+    boundary = text.find(newline, target) + 1 or len(text)
+    if spanning is not None and boundary < len(text):
+        scan = text.rfind(newline, 0, max(target - window, 0)) + 1
+        for m in spanning.finditer(text, scan, min(boundary + window, len(text))):
+            if m.start() >= boundary:
+                break
+            if m.end() > boundary:
+                boundary = text.find(newline, m.end()) + 1 or len(text)
+    return boundary
+
+
+class ParallelLexer:
+    """
+    Lexes one input across a process pool.
+
+    Every chunk but the first may start inside a token the spec did not declare as line spanning (or a declared one
+    longer than the look back window). Stitching therefore checks that the previous chunk's run ends on a position
+    the next chunk's run went through; if not, it lexes sequentially from there until both runs meet on a token end.
+    After that point the lexer is in the same state over the same text, so the output matches the sequential lexer.
+    """
+
+    def __init__(self, token_exprs, workers: int = None, min_chunk: int = 1 << 20):
+        self.token_exprs = token_exprs
+        self.spec = get_spec(token_exprs)
+        self.workers = workers or os.cpu_count() or 1
+        self.min_chunk = min_chunk
+        patterns = [pattern for (pattern, _), spans in zip(self.spec.token_exprs, self.spec.spans_lines) if spans]
+        self.spanning = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns)) if patterns else None
+
+    def boundaries(self, text) -> list[int]:
+        count = max(min(self.workers, len(text) // max(self.min_chunk, 1)), 1)
+        points = [0]
+        for i in range(1, count):
+            point = find_boundary(text, len(text) * i // count, self.spanning if isinstance(text, str) else None)
+            if point > points[-1]:
+                points.append(point)
+        points.append(len(text))
+        return points
+
+    def tokenize(self, text, eof: str = None) -> TokenBatch:
+        points = self.boundaries(text)
+        if len(points) == 2:
+            return Lexer(text, self.token_exprs).tokenize_bulk(eof)
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(len(points) - 1, mp_context=context, initializer=init_worker,
+                                 initargs=(text, self.token_exprs)) as pool:
+            chunks = list(pool.map(lex_range, points[:-1], points[1:]))
+        return self.stitch(text, points, chunks, eof)
+
+    def stitch(self, text, points: list[int], chunks: list[tuple], eof: str = None) -> TokenBatch:
+        lexer = Lexer(text, self.token_exprs, span=True)
+        typecode = offset_typecode(len(text))
+        types, starts, ends = array('H'), array(typecode), array(typecode)
+        pos = 0
+        for index, (chunk_types, chunk_starts, chunk_ends, chunk_pos, ok) in enumerate(chunks):
+            start, stop = points[index], points[index + 1]
+            if pos >= chunk_pos and ok:
+                # the previous chunk's run already covered this one
+                continue
+            if pos == start:
+                first = 0
+            else:
+                # lex on until a token ends where this chunk's run also ended a token
+                first = None
+                while pos < stop:
+                    lexer.pos = pos
+                    token = lexer.next()
+                    pos = lexer.pos
+                    if token is None:
+                        break
+                    types.append(self.spec.tag_ids[token.type])
+                    starts.append(token.start)
+                    ends.append(token.end)
+                    j = bisect_left(chunk_ends, pos)
+                    if j < len(chunk_ends) and chunk_ends[j] == pos:
+                        first = j + 1
+                        break
+                if first is None:
+                    continue
+            types.extend(chunk_types[first:])
+            starts.extend(chunk_starts[first:])
+            ends.extend(chunk_ends[first:])
+            pos = chunk_pos
+            if not ok:
+                # a real lexical error: the sequential lexer reports it
+                lexer.pos = pos
+                lexer.tokenize_bulk()
+        tags = self.spec.tags
+        if eof is not None:
+            tags = tags + [eof]
+            types.append(len(tags) - 1)
+            starts.append(len(text))
+            ends.append(len(text))
+        return TokenBatch(text, tags, types, starts, ends, eof)
+
+
+def tokenize_parallel(text, token_exprs, workers: int = None, eof: str = None) -> TokenBatch:
+    return ParallelLexer(token_exprs, workers).tokenize(text, eof)
@@ -0,0 +1,125 @@
+# On-disk cache of grammar analyses and parse tables.
+# Entries are marshal dumps named after a sha256 key. The key covers everything the tables depend on (the grammar
+# file content, the engine, the eof symbol and the source of the modules that build the tables), so a changed input
+# simply misses and its old entry ages out. The directory is kept under a size bound, least recently used first.
+import hashlib
+import importlib.util
+import marshal
+import os
+import sys
+import tempfile
+
+# bump when the payload layout changes; the interpreter's magic number covers marshalled code objects
+FORMAT = b'LRT1' + importlib.util.MAGIC_NUMBER
+SUFFIX = '.tables'
+
+
+class TableCache:
+
+    def __init__(self, directory: str, max_bytes: int = 64 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        """
+        sha256 of the parts, each a str or bytes, taken with its length so that no two part lists collide.
+        """
+        digest = hashlib.sha256(FORMAT)
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode('utf-8')
+            digest.update(len(part).to_bytes(8, 'little'))
+            digest.update(part)
+        return digest.hexdigest()
+
+    @staticmethod
+    def module_sources(*definitions) -> bytes:
+        """
+        Source of the modules defining the given classes and their bases, or functions, so that editing the table
+        construction invalidates the entries it built.
+        """
+        files = []
+        for definition in definitions:
+            for base in getattr(definition, '__mro__', (definition,)):
+                module = sys.modules.get(base.__module__)
+                path = getattr(module, '__file__', None)
+                if path and path not in files:
+                    files.append(path)
+        sources = []
+        for path in files:
+            with open(path, 'rb') as f:
+                sources.append(f.read())
+        return b'\0'.join(sources)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def load(self, key: str):
+        """
+        The payload stored under key, or None. A hit counts as a use for the eviction order; an entry that cannot be
+        read back is removed.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            if not data.startswith(FORMAT):
+                raise ValueError(f'{path}: not a table cache entry')
+            payload = marshal.loads(memoryview(data)[len(FORMAT):])
+        except (ValueError, EOFError, TypeError):
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return payload
+
+    def store(self, key: str, payload):
+        """
+        Write payload under key. The entry is written to a temporary file and renamed into place, so concurrent
+        readers see either the whole entry or none.
+        """
+        data = FORMAT + marshal.dumps(payload)
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp, self.path(key))
+        except BaseException:
+            self._remove(temp)
+            raise
+        self.evict(keep=key)
+
+    def evict(self, keep: str = None):
+        """
+        Remove the least recently used entries until the directory fits in max_bytes; keep is never removed.
+        """
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(SUFFIX) and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, entry.name, entry.path, stat.st_size))
+                    total += stat.st_size
+        entries.sort()
+        for _, name, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            if name == (keep or '') + SUFFIX:
+                continue
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,4 +1,5 @@
-from util.Lexer import Lexer, Token
+from util.DfaLexer import build_dfa
+from util.Lexer import Lexer, Token, get_spec
 
 
 class TokenGenerator:
@@ -8,20 +9,189 @@ class TokenGenerator:
         file_object = open(self.file_path, 'r')
         self.lexer = Lexer(file_object.read(), token_expr)
         file_object.close()
+        self._tokens = None
+
+    def tokens(self):
+        yield from iter(self.lexer.advance, None)
+
+    def __iter__(self):
+        return self.tokens()
 
     def next_token(self):
         if self.reach_end:
             raise AssertionError("File read completed")
-        if self.lexer.has_next():
-            return self.lexer.next()
-        else:
+        if self._tokens is None:
+            self._tokens = self.tokens()
+        token = next(self._tokens, None)
+        if token is None:
             self.reach_end = True
             return Token('$', None)
+        return token
 
 
 class FileTokenGenerator(TokenGenerator):
+    """
+    Lexes a file lazily, reading it in chunks of chunk_size characters.
+
+    The buffer always holds at least chunk_size characters ahead of the cursor (until the end of file). A match is
+    retried after reading more when it runs into the end of the buffer, or when the pattern that matched or one listed
+    before it could still match with more text, like a block comment that is not closed in the buffer yet or a number
+    whose fraction starts in the next chunk. The latter is told by running the DFA of the spec (see DfaLexer) from the
+    token, so tokens and comments of any length may cross chunk boundaries and come out exactly as Lexer would produce
+    them. Patterns the DFA does not support (anchors, look-arounds, back references) can not be checked and raise
+    ValueError. Consumed text is dropped on every read, so memory stays around two chunks plus the longest token.
+    """
+
+    # bounds of the memo of _state_after: texts up to MEMO_LENGTH characters, cleared at MEMO_SIZE entries
+    MEMO_LENGTH = 64
+    MEMO_SIZE = 1 << 14
+
+    def __init__(self, file_path, token_expr, chunk_size=1 << 16):
+        self.file_path = file_path
+        self.reach_end = False
+        self.chunk_size = chunk_size
+        self.spec = get_spec(token_expr)
+        # rule index of each group number reported in match.lastindex
+        self.group_rules = [None] * (self.spec.regex.groups + 1)
+        for index in range(len(self.spec.token_exprs)):
+            self.group_rules[self.spec.regex.groupindex[f'T{index}']] = index
+        try:
+            self.dfa = build_dfa(self.spec.token_exprs)
+        except ValueError as e:
+            raise ValueError(f'Can not tell where the tokens of {file_path} may cross chunks: {e}') from e
+        self.live_rules = self.dfa.first_live_rules()
+        # the same after the first character, for ASCII ones: a token whose first character rules out its own and every
+        # earlier pattern is never retried
+        self.ascii_live_rules = []
+        for code in range(128):
+            state = self.dfa.table[self.dfa.ascii_classes[code]]
+            self.ascii_live_rules.append(self.live_rules[state] if state >= 0 else len(self.live_rules))
+        self._states = {}
+        self._tokens = None
+        self._file = None
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """
+        Read the next chunk. When the cursor is stuck on one long token, read as much as is buffered so that the
+        buffer doubles and a token of length n costs O(n) copying.
+        """
+        if self._file is None:
+            self._file = open(self.file_path, 'r')
+        pending = len(self._buffer) - self._pos
+        chunk = self._file.read(max(self.chunk_size, pending))
+        if not chunk:
+            self._eof = True
+            self._file.close()
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+
+    def _state_after(self, text: str) -> int:
+        """
+        The DFA state after text from the start state, -1 when the DFA gets stuck in it. Short texts are memoized, the
+        same identifiers and operators coming back all over a file.
+        """
+        state = self._states.get(text)
+        if state is None:
+            dfa = self.dfa
+            table = dfa.table
+            class_count = dfa.class_count
+            ascii_classes = dfa.ascii_classes
+            state = 0
+            for c in text:
+                code = ord(c)
+                state = table[state * class_count + (ascii_classes[code] if code < 128 else dfa.char_class(code))]
+                if state < 0:
+                    break
+            if len(text) <= self.MEMO_LENGTH:
+                if len(self._states) >= self.MEMO_SIZE:
+                    self._states.clear()
+                self._states[text] = state
+        return state
+
+    def _may_match_otherwise(self, buffer: str, pos: int, token_end: int, rule: int) -> bool:
+        """
+        Whether rule, which matched buffer[pos:token_end], or a rule listed before it could match differently at pos
+        once more text is read: the DFA runs from pos while such a rule is alive, and the answer is yes when that lasts
+        to the end of the buffer. The rules alive only get fewer along the run, so the token itself is skipped with
+        _state_after.
+        """
+        dfa = self.dfa
+        table = dfa.table
+        class_count = dfa.class_count
+        ascii_classes = dfa.ascii_classes
+        live_rules = self.live_rules
+        end = len(buffer)
+        state = self._state_after(buffer[pos:token_end])
+        if state < 0:
+            return False
+        pos = token_end
+        while live_rules[state] <= rule:
+            if pos == end:
+                return True
+            code = ord(buffer[pos])
+            state = table[state * class_count + (ascii_classes[code] if code < 128 else dfa.char_class(code))]
+            if state < 0:
+                return False
+            pos += 1
+        return False
+
+    def tokens(self):
+        match = self.spec.regex.match
+        group_tags = self.spec.group_tags
+        group_rules = self.group_rules
+        ascii_live_rules = self.ascii_live_rules
+        while True:
+            if not self._eof and len(self._buffer) - self._pos < self.chunk_size:
+                self._fill()
+                continue
+            buffer, pos = self._buffer, self._pos
+            if pos >= len(buffer):
+                return
+            m = match(buffer, pos)
+            if m is not None and m.end() == pos:
+                m = self.spec.match_nonempty(self.spec.regex, buffer, pos, m)
+            if not self._eof:
+                # the token may go on in the next chunk, or only become a match with it
+                if m is None or m.end() == len(buffer):
+                    self._fill()
+                    continue
+                rule = group_rules[m.lastindex]
+                code = ord(buffer[pos])
+                if (code >= 128 or ascii_live_rules[code] <= rule) and self._may_match_otherwise(buffer, pos, m.end(), rule):
+                    self._fill()
+                    continue
+            if m is None:
+                raise ValueError('Illegal character: %s' % buffer[pos])
+            self._pos = m.end()
+            tag = group_tags[m.lastindex]
+            if tag:
+                yield Token(tag, m.group())
+
+
+class MmapTokenGenerator(TokenGenerator):
+    """
+    Lexes a memory mapped file with the bytes patterns of token_expr. Pages are only touched as the lexer reaches
+    them and token values are decoded on use, so the first token comes out in constant time whatever the file size.
+    The map outlives the last token, whose value may still be read, until close() or the end of a with block.
+    """
+
     def __init__(self, file_path, token_expr):
-        super(FileTokenGenerator, self).__init__()
+        self.file_path = file_path
+        self.reach_end = False
+        self.lexer = Lexer.from_file(file_path, token_expr)
+        self._tokens = None
+
+    def close(self):
+        self.lexer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
 
 class StringTokenGenerator(TokenGenerator):
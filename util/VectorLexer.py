@@ -0,0 +1,196 @@
+# Vectorized lexing for token sets made of character class runs.
+# With numpy installed, a spec whose rules are all a single character (C) or a character followed by a run (C D*,
+# C+ being C C*) is lexed by mapping the whole input through lookup tables: the first character of a token picks its
+# rule and the token runs on while the characters are in the rule's run class. Rules that need more than that to
+# decide where they end, like a NUMBER with an optional sign, fraction or exponent, send the spec to the regex Lexer.
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from util.DfaLexer import RegexParser
+from util.Lexer import Lexer, TokenBatch, get_spec
+from util.LineIndex import offset_typecode
+
+
+def class_rule(pattern: str):
+    """
+    (first, rest) intervals when pattern is a single character class C (rest empty), a run C+ (rest C) or a character
+    followed by a run C D* (rest D), None otherwise.
+    """
+    parser = RegexParser(pattern)
+    try:
+        node = parser.parse()
+    except ValueError:
+        return None
+    if parser.lazy:
+        return None
+    if node[0] == 'set':
+        return node[1], []
+    if node[0] == 'repeat' and node[1][0] == 'set' and node[2] == 1 and node[3] is None:
+        return node[1][1], node[1][1]
+    if node[0] == 'cat' and len(node[1]) == 2:
+        first, rest = node[1]
+        if first[0] == 'set' and rest[0] == 'repeat' and rest[1][0] == 'set' and rest[2] == 0 and rest[3] is None:
+            return first[1], rest[1][1]
+    return None
+
+
+def build_table(token_exprs):
+    """
+    Lookup table from byte to the rule + 1 a token starting with it has (0 for an illegal byte; the first rule wins,
+    as in the regex alternation) and the run class of every rule + 1 as a 256 byte membership table, or None when a
+    rule is not C, C+ or C D*.
+    """
+    table = bytearray(256)
+    runs = [bytearray(256)]
+    for rule, expr in enumerate(token_exprs):
+        found = class_rule(expr[0])
+        if found is None or rule >= 255:
+            return None
+        first, rest = found
+        for lo, hi in first:
+            for code in range(lo, min(hi, 255) + 1):
+                if not table[code]:
+                    table[code] = rule + 1
+        run = bytearray(256)
+        for lo, hi in rest:
+            for code in range(lo, min(hi, 255) + 1):
+                run[code] = 1
+        runs.append(run)
+    return table, runs
+
+
+def agrees(spec, table, runs) -> bool:
+    """
+    Check the tables against the regexes the Lexer would use, on every ASCII character for str input and every byte
+    for bytes input, alone and after a first character of every rule. This catches the few places where re differs
+    from the ASCII classes of RegexParser, like str '\\s' also matching \\x1c-\\x1f.
+    """
+    rules = {spec.regex.groupindex[f'T{rule}']: rule + 1 for rule in range(len(spec.token_exprs))}
+    try:
+        bytes_regex = spec.bytes_regex
+    except ValueError:
+        # non-ASCII patterns, which bytes input can not be lexed with
+        return False
+    for regex, size, char in ((spec.regex, 128, chr), (bytes_regex, 256, lambda code: bytes((code,)))):
+        firsts = {}
+        for code in range(size):
+            m = regex.match(char(code))
+            rule = rules[m.lastindex] if m else 0
+            if rule != table[code] or (m and m.end() != 1):
+                return False
+            firsts.setdefault(rule, code)
+        firsts.pop(0, None)
+        for rule, first in firsts.items():
+            for code in range(size):
+                m = regex.match(char(first) + char(code))
+                if rules[m.lastindex] != rule or (m.end() == 2) != bool(runs[rule][code]):
+                    return False
+    return True
+
+
+class VectorLexer:
+    """
+    Lexes with numpy when the spec allows it (see build_table), falling back to Lexer otherwise or for non-ASCII str
+    input. The rule of a token is fixed by its first character and a run rule takes the longest run of its run class,
+    which is exactly what the regex alternation does; the output is the same TokenBatch.
+
+    Where a token ends only depends on where it starts, but whether a character starts a token depends on the token
+    before it when it is in the run class of another rule, like a digit after a letter with IDENTIFIER [a-z]\\w* or
+    anything after '#' with a comment #[^\\n]*. A character in no run class but that of its own rule (a newline in
+    that spec) ends up in a token of its own rule whatever comes before, so the token it is in ends where a token of
+    its rule starting there would; the token starts are found by following the token ends from those, all at once,
+    until they meet. When every character is like that, a token simply starts where its rule can not go on over it.
+    Following takes as many steps as there are tokens between two such characters: past MAX_STEPS, Lexer is used.
+    """
+
+    MAX_STEPS = 1024
+
+    def __init__(self, token_exprs):
+        self.token_exprs = token_exprs
+        self.spec = get_spec(token_exprs)
+        built = build_table(self.spec.token_exprs) if np is not None else None
+        self.supported = built is not None and agrees(self.spec, *built)
+        if self.supported:
+            table, runs = built
+            self.table = np.frombuffer(bytes(table), dtype=np.uint8)
+            # runs[rule + 1, byte]: whether a token of the rule goes on over the byte
+            self.runs = np.frombuffer(b''.join(runs), dtype=bool).reshape(len(runs), 256)
+            self.run_rules = [rule for rule in range(1, len(runs)) if any(runs[rule])]
+            # bytes in the run class of no rule but the one that starts with them
+            others = self.runs.copy()
+            others[self.table, np.arange(256)] = False
+            self.fixed = ~others.any(axis=0)
+            # bytes a token of the rule that starts with them goes on over
+            self.own = self.runs[self.table, np.arange(256)]
+            # tag id of every rule + 1, -1 for skipped rules and illegal bytes
+            self.type_ids = np.array([-1] + [self.spec.tag_ids[tag] if tag else -1
+                                             for _, tag in self.spec.token_exprs], dtype=np.int32)
+
+    def tokenize(self, text, eof: str = None) -> TokenBatch:
+        if not self.supported or (isinstance(text, str) and not text.isascii()):
+            return Lexer(text, self.token_exprs).tokenize_bulk(eof)
+        codes = np.frombuffer(text.encode('ascii') if isinstance(text, str) else text, dtype=np.uint8)
+        rules = self.table[codes]
+        starts = self.token_starts(codes, rules)
+        if starts is None:
+            return Lexer(text, self.token_exprs).tokenize_bulk(eof)
+        illegal = np.flatnonzero(rules[starts] == 0)
+        if len(illegal):
+            raise Lexer._illegal_character_in(text, int(starts[illegal[0]]))
+        ends = np.append(starts[1:], len(rules))
+        types = self.type_ids[rules[starts]]
+        kept = types >= 0
+        typecode = offset_typecode(len(codes))
+        types = to_array('H', types[kept])
+        starts, ends = to_array(typecode, starts[kept]), to_array(typecode, ends[kept])
+        tags = self.spec.tags
+        if eof is not None:
+            tags = tags + [eof]
+            types.append(len(tags) - 1)
+            starts.append(len(codes))
+            ends.append(len(codes))
+        return TokenBatch(text, tags, types, starts, ends, eof)
+
+    def token_starts(self, codes, rules):
+        """
+        The token starts as an array of positions, None when following them takes more than MAX_STEPS.
+        """
+        size = len(codes)
+        if self.fixed.all():
+            # a byte goes on with a token of its own rule or none
+            cut = np.empty(size, dtype=bool)
+            cut[:1] = True
+            np.not_equal(rules[1:], rules[:-1], out=cut[1:])
+            cut[1:] |= ~self.own[codes[1:]]
+            return np.flatnonzero(cut)
+        # ends[pos]: where a token starting at pos ends, size past the end
+        ends = np.arange(1, size + 2, dtype=np.int32)
+        ends[size] = size
+        for rule in self.run_rules:
+            outside = ~self.runs[rule][codes]
+            stops = np.append(np.flatnonzero(outside), size).astype(np.int32)
+            at = np.flatnonzero(rules == rule)
+            ends[at] = stops[np.cumsum(outside, dtype=np.int32)[at]]
+        found = np.zeros(size + 1, dtype=bool)
+        front = np.append(0, ends[np.flatnonzero(self.fixed[codes])])
+        for _ in range(self.MAX_STEPS):
+            found[front] = True
+            front = ends[front]
+            front = front[~found[front]]
+            if not len(front):
+                return np.flatnonzero(found[:size])
+        return None
+
+
+def to_array(typecode: str, values) -> array:
+    result = array(typecode)
+    result.frombytes(values.astype(f'u{result.itemsize}').tobytes())
+    return result
+
+
+def tokenize_vectorized(text, token_exprs, eof: str = None) -> TokenBatch:
+    return VectorLexer(token_exprs).tokenize(text, eof)